@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(samples, value):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1,
+                       round(value / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(timings, queries=None):
+    """Сводка по замерам: время в миллисекундах и число SQL-запросов."""
+    timings = [timing * 1000 for timing in timings]
+    result = {
+        'iterations': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+    for value in PERCENTILES:
+        result[f'p{value}_ms'] = round(percentile(timings, value), 3)
+    if queries is not None:
+        result['queries_min'] = min(queries)
+        result['queries_max'] = max(queries)
+    return result
+
+
+def measure(func, iterations, setup=None, rollback=False):
+    """Вызывает func iterations раз и возвращает сводку.
+
+    setup выполняется перед каждым вызовом и в замер не входит.
+    При rollback=True каждый вызов выполняется в транзакции,
+    которая затем откатывается, чтобы не менять данные."""
+    timings = []
+    queries = []
+    for _ in range(iterations):
+        with transaction.atomic():
+            if setup is not None:
+                setup()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - started)
+            queries.append(len(context.captured_queries))
+            transaction.set_rollback(rollback)
+    return summarize(timings, queries)
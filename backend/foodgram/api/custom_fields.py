@@ -1,15 +1,96 @@
 import base64
+import binascii
+import hashlib
+import tempfile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files import File
 from rest_framework import serializers
 
+from recipes.models import Tag
+from recipes.tag_registry import tag_registry
+
+BASE64_CHUNK_SIZE = 64 * 1024
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def decode_base64(payload):
+    """Декодирует base64 частями во временный файл (в памяти до
+    SPOOL_MAX_SIZE байт, затем на диске). Возвращает файл и sha256
+    содержимого. payload не должен содержать пробельных символов:
+    иначе части не совпадут с границами групп base64."""
+    file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    digest = hashlib.sha256()
+    for start in range(0, len(payload), BASE64_CHUNK_SIZE):
+        chunk = base64.b64decode(
+            payload[start:start + BASE64_CHUNK_SIZE], validate=True
+        )
+        digest.update(chunk)
+        file.write(chunk)
+    file.seek(0)
+    return file, digest.hexdigest()
+
 
 class Base64ImageField(serializers.ImageField):
-    """Поле для работы с изображениями"""
+    """Поле для работы с изображениями в base64.
+
+    Файл получает имя из sha256 содержимого: если такой файл уже есть
+    в хранилище, он используется повторно. Новый файл записывается
+    в хранилище только при сохранении модели, поэтому ошибка валидации
+    или откат транзакции не оставляют в media/ лишних файлов."""
+    default_error_messages = {
+        'invalid_base64': 'Некорректные данные base64.',
+        'max_size': 'Размер изображения не должен превышать {max_size} байт.',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        if not (isinstance(data, str) and data.startswith('data:image')):
+            return super().to_internal_value(data)
+        header, _, payload = data.partition(';base64,')
+        ext = header.split('/')[-1]
+        # Как и b64decode без validate, допускаем переносы строк
+        # и пробелы внутри base64.
+        payload = ''.join(payload.split())
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(payload) // 4 * 3 > max_size:
+            self.fail('max_size', max_size=max_size)
+        try:
+            file, digest = decode_base64(payload)
+        except binascii.Error:
+            self.fail('invalid_base64')
+        try:
+            image = super().to_internal_value(
+                File(file, name=f'{digest}.{ext}')
+            )
+        except serializers.ValidationError:
+            file.close()
+            raise
+        return self.existing_name(image) or image
+
+    def existing_name(self, image):
+        """Имя уже сохраненного файла с тем же содержимым или None."""
+        model_field = self.parent.Meta.model._meta.get_field(self.source)
+        name = model_field.generate_filename(None, image.name)
+        if model_field.storage.exists(name):
+            image.close()
+            return name
+        return None
+
 
-        return super().to_internal_value(data)
+class TagPrimaryKeyField(serializers.PrimaryKeyRelatedField):
+    """Поле тэга по pk, которое проверяет значение по tag_registry
+    без запроса к БД."""
+    def __init__(self, **kwargs):
+        kwargs.setdefault('queryset', Tag.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            tag = tag_registry.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if tag is None:
+            self.fail('does_not_exist', pk_value=data)
+        return tag
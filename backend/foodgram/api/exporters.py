@@ -0,0 +1,198 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.units import merge_amounts
+
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """Базовый экспортер списка покупок.
+
+    Строки берутся из агрегированного по ингредиентам queryset через
+    iterator() и объединяются merge_amounts: одинаковые продукты
+    в разных единицах и с почти одинаковыми названиями складываются.
+    merge_amounts сначала читает все строки, держа в памяти по группе
+    на продукт, поэтому потоком отдается только вывод."""
+    format = None
+    content_type = None
+
+    def __init__(self, user, ingredients):
+        self.user = user
+        self.ingredients = ingredients
+        self.today = timezone.now()
+
+    @property
+    def filename(self):
+        return f'{self.user.username}_shopping_list.{self.format}'
+
+    def rows(self):
+        return merge_amounts(self.ingredients.iterator())
+
+    def stream(self):
+        raise NotImplementedError
+
+    def response(self, cache_key=None):
+        """Отдает список из кэша, если он там есть, иначе
+        формирует его потоком и сохраняет в кэш по ключу cache_key."""
+        content = cache.get(cache_key) if cache_key else None
+        if content is not None:
+            response = HttpResponse(content, content_type=self.content_type)
+        else:
+            stream = self.stream()
+            if cache_key:
+                stream = cache_stream(stream, cache_key)
+            response = StreamingHttpResponse(
+                stream, content_type=self.content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename={self.filename}'
+        )
+        return response
+
+
+class TextExporter(ShoppingListExporter):
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def stream(self):
+        yield (
+            f'Список покупок пользователя: {self.user.username}\n\n'
+            f'Дата: {self.today:%Y-%m-%d}\n\n'
+        )
+        for ingredient in self.rows():
+            yield (
+                f'- {ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]})'
+                f' - {ingredient["final_amount"]}\n'
+            )
+        yield f'\nFoodgram ({self.today:%Y})'
+
+
+class CSVExporter(ShoppingListExporter):
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def stream(self):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in self.rows():
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['final_amount'],
+            ))
+
+
+class JSONExporter(ShoppingListExporter):
+    format = 'json'
+    content_type = 'application/json; charset=utf-8'
+
+    def stream(self):
+        yield (
+            f'{{"user": {json.dumps(self.user.username)}, '
+            f'"date": "{self.today:%Y-%m-%d}", "ingredients": ['
+        )
+        separator = ''
+        for ingredient in self.rows():
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['final_amount'],
+            }, ensure_ascii=False)
+            separator = ', '
+        yield ']}'
+
+
+class PDFExporter(ShoppingListExporter):
+    """PDF-версия списка покупок.
+
+    reportlab формирует документ целиком при сохранении, поэтому
+    строки по-прежнему читаются потоком, а готовый файл отдаётся
+    частями по PDF_CHUNK_SIZE байт."""
+    format = 'pdf'
+    content_type = 'application/pdf'
+    font_size = 12
+    margin = 50
+    line_height = 18
+
+    def stream(self):
+        register_pdf_font()
+        buffer = io.BytesIO()
+        page = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        y = height - self.margin
+        for line in self.lines():
+            if y < self.margin:
+                page.showPage()
+                y = height - self.margin
+            page.setFont(PDF_FONT_NAME, self.font_size)
+            page.drawString(self.margin, y, line)
+            y -= self.line_height
+        page.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(PDF_CHUNK_SIZE), b'')
+
+    def lines(self):
+        yield f'Список покупок пользователя: {self.user.username}'
+        yield f'Дата: {self.today:%Y-%m-%d}'
+        yield ''
+        for ingredient in self.rows():
+            yield (
+                f'- {ingredient["ingredient__name"]} '
+                f'({ingredient["ingredient__measurement_unit"]})'
+                f' - {ingredient["final_amount"]}'
+            )
+        yield ''
+        yield f'Foodgram ({self.today:%Y})'
+
+
+def cache_stream(stream, cache_key):
+    """Пропускает поток через себя и после его завершения кладет
+    содержимое в кэш, если оно не превышает лимит размера."""
+    chunks = []
+    size = 0
+    for chunk in stream:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        if chunks is not None:
+            size += len(chunk)
+            if size > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                chunks = None
+            else:
+                chunks.append(chunk)
+        yield chunk
+    if chunks is not None:
+        cache.set(
+            cache_key, b''.join(chunks), settings.SHOPPING_LIST_CACHE_TIMEOUT
+        )
+
+
+def register_pdf_font():
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont(PDF_FONT_NAME, settings.SHOPPING_LIST_PDF_FONT)
+        )
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (TextExporter, CSVExporter, JSONExporter, PDFExporter)
+}
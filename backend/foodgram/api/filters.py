@@ -1,24 +1,47 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from django.db.models.functions import Upper
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, RecipeTag
+from recipes.search import search
+from recipes.tag_registry import tag_registry
+
+TAGS_MODES = (('any', 'Любой из тэгов'), ('all', 'Все тэги'))
+
+
+def tag_choices():
+    return [(tag.slug, tag.slug) for tag in tag_registry.all()]
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith',
-    )
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        """Сначала ингредиенты, начинающиеся с value,
+        затем содержащие value. Внутри групп - по названию без учета
+        регистра, как в ingredient_index."""
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('rank', Upper('name'), 'id')
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags',
+    )
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES,
+        method='filter_tags_mode',
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited'
@@ -26,10 +49,35 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'tags_mode', 'is_favorited',
+                  'is_in_shopping_cart', 'search')
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тэгов или, при tags_mode=all, со всеми
+        тэгами. Фильтрует подзапросом EXISTS, без JOIN и дублей."""
+        ids = [tag_registry.get_by_slug(slug).id for slug in value]
+        if self.form.cleaned_data.get('tags_mode') != 'all':
+            return queryset.filter(Exists(RecipeTag.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=ids
+            )))
+        for tag_id in ids:
+            queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                recipe=OuterRef('pk'), tag_id=tag_id
+            )))
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию, ингредиентам и описанию рецепта.
+        Без ?ordering= результаты упорядочены по релевантности."""
+        return search(queryset, value)
+
+    def filter_tags_mode(self, queryset, name, value):
+        """Режим учитывается в filter_tags."""
+        return queryset
 
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
@@ -40,3 +88,14 @@ class RecipeFilter(FilterSet):
         if self.request.user.is_authenticated and value:
             return queryset.filter(shoppingcart__user=self.request.user)
         return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Сортировка с id в конце для однозначного порядка страниц.
+    -favourites_count, -id совпадает с индексом рецептов."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering or ordering[-1].lstrip('-') == 'id':
+            return ordering
+        return [*ordering, '-id' if ordering[-1].startswith('-') else 'id']
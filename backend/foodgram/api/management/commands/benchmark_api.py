@@ -0,0 +1,258 @@
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import resolve, reverse
+from rest_framework.authtoken.models import Token
+
+from api.benchmarks import measure
+from api.urls import v1_router
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription, User
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAAC'
+    'VBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAA'
+    'AggCByxOyYQAAAABJRU5ErkJggg=='
+)
+# Маршруты роутера без сценариев: служебные действия djoser
+# (активация, сброс и смена пароля и username) и корень API.
+SKIPPED_ROUTES = {
+    'api-root', 'users-activation', 'users-resend-activation',
+    'users-reset-password', 'users-reset-password-confirm',
+    'users-reset-username', 'users-reset-username-confirm',
+    'users-set-password', 'users-set-username',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет эндпоинты API через тестовый клиент Django и выводит '
+        'в JSON перцентили времени ответа и число SQL-запросов. '
+        'Изменяющие запросы выполняются в откатываемой транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument(
+            '--user',
+            help='username пользователя, от имени которого идут запросы. '
+                 'По умолчанию - пользователь с наибольшим числом подписок.',
+        )
+        parser.add_argument(
+            '--only', nargs='*',
+            help='Имена сценариев, которые нужно прогнать.',
+        )
+        parser.add_argument('--output', help='Файл для результата.')
+
+    def handle(self, *args, **options):
+        self.user = self.get_user(options['user'])
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.anonymous = Client()
+        scenarios = self.get_scenarios()
+        self.check_routes(scenarios)
+        media_root = tempfile.mkdtemp()
+        results = {}
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                for name, scenario in scenarios.items():
+                    if options['only'] and name not in options['only']:
+                        continue
+                    results[name] = self.run(scenario, options['iterations'])
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+        report = json.dumps({
+            'user': self.user.username,
+            'dataset': self.get_dataset_size(),
+            'endpoints': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = User.objects.annotate(
+                follows=Count('follower')
+            ).order_by('-follows', 'id').first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, сначала выполните generate_data.'
+            )
+        return user
+
+    def get_dataset_size(self):
+        return {
+            model._meta.model_name: model.objects.count()
+            for model in (User, Tag, Ingredient, Recipe, Favourite,
+                          ShoppingCart, Subscription)
+        }
+
+    def check_routes(self, scenarios):
+        """Каждый маршрут v1_router, кроме SKIPPED_ROUTES, должен быть
+        покрыт хотя бы одним сценарием."""
+        covered = {resolve(url).url_name for _, url, *_ in scenarios.values()}
+        missing = sorted(
+            {url.name for url in v1_router.urls}
+            - covered - SKIPPED_ROUTES
+        )
+        if missing:
+            raise CommandError(
+                'Нет сценариев для маршрутов: ' + ', '.join(missing)
+            )
+
+    def run(self, scenario, iterations):
+        method, url, data, client, setup = scenario
+        extra = {}
+        if method in ('post', 'patch'):
+            extra['content_type'] = 'application/json'
+        status_codes = set()
+
+        def request():
+            response = getattr(client, method)(url, data, **extra)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            status_codes.add(response.status_code)
+
+        result = measure(
+            request, iterations, setup=setup, rollback=method != 'get'
+        )
+        result['url'] = url
+        result['method'] = method.upper()
+        result['status_codes'] = sorted(status_codes)
+        return result
+
+    def get_scenarios(self):
+        """Сценарии по всем маршрутам роутера api/urls.py."""
+        user = self.user
+        recipe = Recipe.objects.exclude(author=user).first()
+        own_recipe = Recipe.objects.filter(author=user).first() or recipe
+        author = User.objects.exclude(pk=user.pk).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if None in (recipe, author, tag, ingredient):
+            raise CommandError(
+                'Недостаточно данных, сначала выполните generate_data.'
+            )
+        recipe_ingredients = list(RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', flat=True))
+        recipe_data = json.dumps({
+            'ingredients': [{'id': ingredient.id, 'amount': 10}],
+            'tags': [tag.id],
+            'image': IMAGE,
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для бенчмарка',
+            'cooking_time': 10,
+        })
+
+        def favourite():
+            Favourite.objects.get_or_create(user=user, recipe=recipe)
+
+        def cart():
+            ShoppingCart.objects.get_or_create(user=user, recipe=recipe)
+
+        def subscription():
+            Subscription.objects.get_or_create(user=user, author=author)
+
+        def unsubscribed():
+            Subscription.objects.filter(user=user, author=author).delete()
+
+        def not_favourite():
+            Favourite.objects.filter(user=user, recipe=recipe).delete()
+
+        def not_in_cart():
+            ShoppingCart.objects.filter(user=user, recipe=recipe).delete()
+
+        client = self.client
+        return {
+            'tags-list': ('get', reverse('tags-list'), {}, client, None),
+            'tags-detail': (
+                'get', reverse('tags-detail', args=[tag.id]), {}, client,
+                None),
+            'ingredients-list': (
+                'get', reverse('ingredients-list'),
+                {'name': ingredient.name[:2]}, client, None),
+            'ingredients-detail': (
+                'get', reverse('ingredients-detail', args=[ingredient.id]), {},
+                client, None),
+            'recipes-list': (
+                'get', reverse('recipes-list'), {'limit': 6}, client, None),
+            'recipes-list-anonymous': (
+                'get', reverse('recipes-list'), {'limit': 6}, self.anonymous,
+                None),
+            'recipes-list-favorited': (
+                'get', reverse('recipes-list'),
+                {'limit': 6, 'is_favorited': 1}, client, None),
+            'recipes-list-in-cart': (
+                'get', reverse('recipes-list'),
+                {'limit': 6, 'is_in_shopping_cart': 1}, client, None),
+            'recipes-list-tags': (
+                'get', reverse('recipes-list'),
+                {'limit': 6, 'tags': tag.slug}, client, None),
+            'recipes-list-author': (
+                'get', reverse('recipes-list'),
+                {'limit': 6, 'author': author.id}, client, None),
+            'recipes-detail': (
+                'get', reverse('recipes-detail', args=[recipe.id]), {},
+                client, None),
+            'recipes-create': (
+                'post', reverse('recipes-list'), recipe_data, client, None),
+            'recipes-update': (
+                'patch', reverse('recipes-detail', args=[own_recipe.id]),
+                recipe_data, client, None),
+            'recipes-delete': (
+                'delete', reverse('recipes-detail', args=[own_recipe.id]), {},
+                client, None),
+            'recipes-favorite-add': (
+                'post', reverse('recipes-favorite', args=[recipe.id]), '{}',
+                client, not_favourite),
+            'recipes-favorite-remove': (
+                'delete', reverse('recipes-favorite', args=[recipe.id]), {},
+                client, favourite),
+            'recipes-shopping-cart-add': (
+                'post', reverse('recipes-shopping-cart', args=[recipe.id]),
+                '{}', client, not_in_cart),
+            'recipes-shopping-cart-remove': (
+                'delete', reverse('recipes-shopping-cart', args=[recipe.id]),
+                {}, client, cart),
+            'recipes-feed': (
+                'get', reverse('recipes-feed'), {'limit': 6}, client, None),
+            'recipes-trending': (
+                'get', reverse('recipes-trending'), {'limit': 6}, client,
+                None),
+            'recipes-similar': (
+                'get', reverse('recipes-similar', args=[recipe.id]),
+                {'limit': 6}, client, None),
+            'recipes-cook-with': (
+                'get', reverse('recipes-cook-with'),
+                {'ingredients': ','.join(map(str, recipe_ingredients)),
+                 'missing': 1, 'limit': 6}, client, None),
+            'recipes-download-shopping-cart': (
+                'get', reverse('recipes-download-shopping-cart'), {}, client,
+                None),
+            'users-list': (
+                'get', reverse('users-list'), {'limit': 6}, client, None),
+            'users-detail': (
+                'get', reverse('users-detail', args=[author.id]), {}, client,
+                None),
+            'users-me': ('get', reverse('users-me'), {}, client, None),
+            'users-subscriptions': (
+                'get', reverse('users-subscriptions'),
+                {'limit': 6, 'recipes_limit': 3}, client, None),
+            'users-subscribe': (
+                'post', reverse('users-subscribe', args=[author.id]), '{}',
+                client, unsubscribed),
+            'users-unsubscribe': (
+                'delete', reverse('users-subscribe', args=[author.id]), {},
+                client, subscription),
+        }
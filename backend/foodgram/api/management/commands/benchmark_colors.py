@@ -0,0 +1,70 @@
+import json
+import random
+import time
+
+import webcolors
+from django.core.management.base import BaseCommand
+
+from api.utils import Hex2NameColor
+from recipes.colors import hex_to_name
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет преобразование цветов при массовом импорте тэгов: '
+        'прежний поиск точного названия в webcolors и нормализацию '
+        'в #rrggbb с поиском ближайшего названия с кэшем и без него.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--count', type=int, default=100000)
+        parser.add_argument(
+            '--distinct', type=int, default=500,
+            help='Количество разных цветов среди импортируемых тэгов.',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        palette = [
+            f'#{rng.randrange(1 << 24):06X}'
+            for _ in range(options['distinct'])
+        ]
+        colors = [rng.choice(palette) for _ in range(options['count'])]
+        field = Hex2NameColor()
+        hex_to_name.cache_clear()
+        results = {
+            'webcolors_hex_to_name': self.run(colors, exact_name),
+            'to_hex_and_nearest_name_uncached': self.run(
+                colors,
+                lambda color: hex_to_name.__wrapped__(
+                    field.to_internal_value(color))
+            ),
+            'to_hex_and_nearest_name_cached': self.run(
+                colors,
+                lambda color: hex_to_name(field.to_internal_value(color))
+            ),
+        }
+        results['to_hex_and_nearest_name_cached']['cache'] = (
+            hex_to_name.cache_info()._asdict()
+        )
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, colors, convert):
+        started = time.perf_counter()
+        for color in colors:
+            convert(color)
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': len(colors),
+            'total_ms': round(elapsed * 1000, 3),
+            'rows_per_second': round(len(colors) / elapsed),
+        }
+
+
+def exact_name(color):
+    """Прежнее поведение Hex2NameColor: только точное название."""
+    try:
+        return webcolors.hex_to_name(color)
+    except ValueError:
+        return None
@@ -0,0 +1,77 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+
+from api.benchmarks import measure
+from recipes import feed
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает чтение ленты подписок из предрассчитанной таблицы '
+        'FeedEntry с выборкой рецептов через JOIN по подпискам. '
+        'Все изменения выполняются в откатываемой транзакции.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument(
+            '--follows', type=int, nargs='*', default=[10, 100, 1000],
+            help='Количество авторов, на которых подписан читатель.',
+        )
+
+    def handle(self, *args, **options):
+        authors = list(User.objects.annotate(
+            recipes_count=Count('recipes')
+        ).filter(recipes_count__gt=0).order_by(
+            '-recipes_count', 'id'
+        ).values_list('id', flat=True)[:max(options['follows'])])
+        if not authors:
+            raise CommandError(
+                'Рецептов нет, сначала выполните generate_data.'
+            )
+        results = {}
+        for follows in options['follows']:
+            with transaction.atomic():
+                results[follows] = self.run(
+                    authors[:follows], options['iterations'],
+                    options['limit']
+                )
+                transaction.set_rollback(True)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, authors, iterations, limit):
+        reader = User.objects.create_user(
+            username='feed_benchmark', email='feed_benchmark@example.com',
+            password=None
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=reader, author_id=author_id)
+            for author_id in authors
+        )
+        feed.backfill((reader.id, author_id) for author_id in authors)
+        recipe = Recipe.objects.filter(author_id=authors[0]).first()
+
+        def read_join():
+            list(Recipe.objects.filter(
+                author__following__user=reader
+            ).values_list('id', flat=True)[:limit])
+
+        def read_feed():
+            list(Recipe.objects.filter(
+                feed_entries__user=reader
+            ).values_list('id', flat=True)[:limit])
+
+        return {
+            'follows': len(authors),
+            'fan_out_on_read': measure(read_join, iterations),
+            'fan_out_on_write': measure(read_feed, iterations),
+            'publish_fan_out': measure(
+                lambda: feed.fan_out(recipe), iterations, rollback=True
+            ),
+        }
@@ -0,0 +1,84 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.pagination import Cursor
+
+from api.benchmarks import measure
+from api.pagination import KeysetPagination
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает время ответа /api/recipes/ на глубокой странице '
+        'при постраничной пагинации (OFFSET и COUNT(*)) и при '
+        'пагинации по ключу (?cursor=).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument(
+            '--user',
+            help='username пользователя для списков избранного и корзины. '
+                 'По умолчанию - пользователь с наименьшим id.',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(
+            **({'username': options['user']} if options['user'] else {})
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, сначала выполните generate_data.'
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        scenarios = {
+            'recipes-list': ({}, {}),
+            'recipes-list-favorited': (
+                {'is_favorited': 1}, {'favourites__user': user}),
+            'recipes-list-in-cart': (
+                {'is_in_shopping_cart': 1}, {'shoppingcart__user': user}),
+        }
+        results = {}
+        for name, (params, lookups) in scenarios.items():
+            results[name] = self.run(client, params, lookups, options)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run(self, client, params, lookups, options):
+        url = reverse('recipes-list')
+        offset = (options['page'] - 1) * options['limit']
+        ids = Recipe.objects.filter(**lookups).values_list('id', flat=True)
+        if offset and not ids[offset - 1:offset]:
+            return {'skipped': f'меньше {offset + 1} рецептов'}
+        params = {**params, 'limit': options['limit']}
+        paginator = KeysetPagination()
+        paginator.base_url = url
+        position = ids[offset - 1] if offset else None
+        cursor = parse_qs(urlsplit(paginator.encode_cursor(
+            Cursor(offset=0, reverse=False, position=position)
+        )).query).get(paginator.cursor_query_param, [''])[0]
+        status_codes = set()
+
+        def get(data):
+            status_codes.add(client.get(url, data).status_code)
+
+        return {
+            'page': options['page'],
+            'offset': measure(
+                lambda: get({**params, 'page': options['page']}),
+                options['iterations']
+            ),
+            'cursor': measure(
+                lambda: get({**params, 'cursor': cursor}),
+                options['iterations']
+            ),
+            'status_codes': sorted(status_codes),
+        }
@@ -0,0 +1,93 @@
+import itertools
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import summarize
+from recipes.similarity import SimilarityIndex
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет на синтетических рецептах построение индекса похожести '
+        'и время запросов похожих рецептов и рецептов из имеющихся '
+        'ингредиентов, а также сравнивает результат MinHash '
+        'с точным перебором.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--per-recipe', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        sets = self.generate(rng, options)
+        started = time.perf_counter()
+        index = SimilarityIndex()
+        index.extend(sets)
+        build = time.perf_counter() - started
+
+        limit = options['limit']
+        samples = rng.sample(list(sets), options['iterations'])
+        similar = []
+        recall = []
+        for recipe_id in samples:
+            started = time.perf_counter()
+            found = index.similar(recipe_id, limit)
+            similar.append(time.perf_counter() - started)
+            recall.append(self.recall(sets, recipe_id, found, limit))
+        cook_with = []
+        for recipe_id in samples:
+            pantry = set(sets[recipe_id]) | set(
+                sets[rng.choice(samples)])
+            started = time.perf_counter()
+            index.cook_with(pantry, limit, missing=1)
+            cook_with.append(time.perf_counter() - started)
+
+        self.stdout.write(json.dumps({
+            'recipes': options['recipes'],
+            'ingredients': options['ingredients'],
+            'num_perm': index.num_perm,
+            'build_ms': round(build * 1000, 1),
+            'similar': summarize(similar),
+            'similar_recall_at_limit': round(sum(recall) / len(recall), 3),
+            'cook_with': summarize(cook_with),
+        }, indent=2))
+
+    def generate(self, rng, options):
+        """Наборы ингредиентов рецептов. Частота ингредиентов
+        распределена по закону Ципфа."""
+        cum_weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, options['ingredients'] + 1)
+        ))
+        ingredient_ids = range(1, options['ingredients'] + 1)
+        return {
+            recipe_id: set(rng.choices(
+                ingredient_ids, cum_weights=cum_weights,
+                k=rng.randint(2, options['per_recipe'] * 2 - 2)
+            ))
+            for recipe_id in range(1, options['recipes'] + 1)
+        }
+
+    def recall(self, sets, recipe_id, found, limit):
+        """Доля найденных рецептов с коэффициентом Жаккара не ниже,
+        чем у limit-го рецепта точного перебора."""
+        own = sets[recipe_id]
+        exact = sorted(
+            (len(own & other) / len(own | other)
+             for pk, other in sets.items() if pk != recipe_id),
+            reverse=True
+        )[:limit]
+        if not exact or not exact[-1]:
+            return 1.0
+        hits = sum(
+            len(own & sets[pk]) / len(own | sets[pk]) >= exact[-1]
+            for pk in found
+        )
+        return hits / len(exact)
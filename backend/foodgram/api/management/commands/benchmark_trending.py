@@ -0,0 +1,104 @@
+import heapq
+import itertools
+import json
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.trending import accumulate, logaddexp, merge_top
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает на синтетических событиях добавления в избранное '
+        'инкрементальный подсчет популярности рецептов пачками '
+        'с полным пересчетом по всем событиям.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--events', type=int, default=2000000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.now = time.time()
+        size = settings.TRENDING_TOP_K
+        scores = {}
+        top = []
+        batches = 0
+        started = time.perf_counter()
+        for batch in self.batches():
+            updates = accumulate({}, batch)
+            for recipe_id, score in updates.items():
+                updates[recipe_id] = logaddexp(scores.get(recipe_id), score)
+            scores.update(updates)
+            top = merge_top(top, updates, size)
+            batches += 1
+        incremental = time.perf_counter() - started
+
+        started = time.perf_counter()
+        totals = {}
+        for batch in self.batches():
+            for recipe_id, timestamp, weight in batch:
+                totals[recipe_id] = totals.get(recipe_id, 0) + weight * 2 ** (
+                    (timestamp - self.now) / settings.TRENDING_HALF_LIFE
+                )
+        rescan_top = heapq.nlargest(
+            size, ((score, recipe_id) for recipe_id, score in totals.items())
+        )
+        rescan = time.perf_counter() - started
+
+        self.stdout.write(json.dumps({
+            'events': options['events'],
+            'recipes': options['recipes'],
+            'batch_size': options['batch_size'],
+            'incremental_total_ms': round(incremental * 1000, 1),
+            'incremental_per_batch_ms': round(incremental * 1000 / batches, 3),
+            'incremental_events_per_second': round(
+                options['events'] / incremental),
+            'full_rescan_ms': round(rescan * 1000, 1),
+            'full_rescan_every_batch_ms': round(rescan * 1000 * batches, 1),
+            'top_matches_rescan': [pk for _, pk in top[:100]] == [
+                pk for _, pk in rescan_top[:100]],
+            'top_scores_close': all(
+                math.isclose(
+                    score, math.log(total) + self.shift(), rel_tol=1e-9)
+                for (score, _), (total, _) in zip(top[:100], rescan_top[:100])
+            ),
+        }, indent=2))
+
+    def shift(self):
+        """Разница между логарифмической оценкой от эпохи и
+        затуханием к текущему моменту."""
+        return (
+            (self.now - settings.TRENDING_EPOCH)
+            * math.log(2) / settings.TRENDING_HALF_LIFE
+        )
+
+    def batches(self):
+        """События (recipe_id, timestamp, weight) по возрастанию времени.
+        Популярность рецептов распределена по закону Ципфа."""
+        rng = random.Random(self.options['seed'])
+        cum_weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, self.options['recipes'] + 1)
+        ))
+        recipe_ids = range(1, self.options['recipes'] + 1)
+        span = self.options['days'] * 86400
+        step = span / self.options['events']
+        emitted = 0
+        while emitted < self.options['events']:
+            size = min(
+                self.options['batch_size'], self.options['events'] - emitted
+            )
+            yield [
+                (recipe_id, self.now - span + (emitted + number) * step, 1.0)
+                for number, recipe_id in enumerate(
+                    rng.choices(recipe_ids, cum_weights=cum_weights, k=size))
+            ]
+            emitted += size
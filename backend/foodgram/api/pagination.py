@@ -1,5 +1,130 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from recipes.cache import RECIPES_VERSION_KEY, get_version
+
+
+class KeysetPagination(CursorPagination):
+    """Пагинация по ключу: следующая страница начинается после
+    последнего показанного объекта, без OFFSET и COUNT(*).
+    Порядок берется из queryset или Meta.ordering модели."""
+    ordering = '-id'
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return tuple(ordering) or (self.ordering,)
 
 
 class LimitPagination(PageNumberPagination):
+    """Постраничная пагинация с параметром limit. С параметром
+    cursor (в том числе пустым для первой страницы) переключается
+    на KeysetPagination."""
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    keyset_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.keyset_paginator = KeysetPagination()
+            return self.keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берет размер списка из кэша по ключу
+    cache_key, а для больших таблиц без фильтров может
+    использовать оценку планировщика PostgreSQL."""
+
+    def __init__(self, *args, cache_key, estimate=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_key = cache_key
+        self.estimate = estimate
+        self.count_exact = True
+
+    @cached_property
+    def count(self):
+        cached = cache.get(self.cache_key)
+        if cached is None:
+            estimate = self.estimate_count() if self.estimate else None
+            if estimate is None:
+                cached = (super().count, True)
+            else:
+                cached = (estimate, False)
+            cache.set(
+                self.cache_key, cached, settings.RECIPE_COUNT_CACHE_TIMEOUT
+            )
+        self.count_exact = cached[1]
+        return cached[0]
+
+    def estimate_count(self):
+        """Оценка числа строк из pg_class.reltuples, если она
+        не меньше RECIPE_COUNT_ESTIMATE_THRESHOLD."""
+        threshold = settings.RECIPE_COUNT_ESTIMATE_THRESHOLD
+        if threshold is None or connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row is None or row[0] < threshold:
+            return None
+        return row[0]
+
+
+class RecipePagination(LimitPagination):
+    """Пагинация списка рецептов с кэшированием COUNT(*) по набору
+    фильтров. Кэш сбрасывается при изменении рецептов, избранного,
+    корзин и тэгов рецептов."""
+    user_filters = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        filters = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+            if name not in (self.page_query_param,
+                            self.page_size_query_param, 'ordering')
+        )
+        user_id = None
+        if any(name in self.user_filters for name, _ in filters):
+            user_id = request.user.id
+        signature = hashlib.md5(
+            repr((request.path, filters, user_id)).encode()
+        ).hexdigest()
+        version = get_version(RECIPES_VERSION_KEY)
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            cache_key=f'recipes:count:{version}:{signature}',
+            estimate=not filters,
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('count', self.page.paginator.count),
+            ('count_exact', self.page.paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -1,12 +1,19 @@
+from functools import partial
+
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.cache import bump_recipe_carts
+from recipes.colors import hex_to_name
 from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.tag_registry import tag_registry
 from users.models import Subscription, User
-from .custom_fields import Base64ImageField
-from .utils import Hex2NameColor, create_ingredient
+from .custom_fields import Base64ImageField, TagPrimaryKeyField
+from .utils import (Hex2NameColor, create_ingredient, get_int_query_param,
+                    update_ingredients, update_tags)
 
 
 class UserSignUpSerializer(UserSerializer):
@@ -78,6 +85,8 @@ class UserGetRetrieveSerializer(UserSerializer):
         read_only_fields = ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return (
             self.context.get('request').user.is_authenticated
             and Subscription.objects.filter(user=self.context['request'].user,
@@ -88,10 +97,19 @@ class UserGetRetrieveSerializer(UserSerializer):
 class TagSerialiser(serializers.ModelSerializer):
     """Сериализатор тегов"""
     color = Hex2NameColor()
+    color_name = serializers.SerializerMethodField()
 
     class Meta:
         model = Tag
-        fields = ('id', 'name', 'color', 'slug')
+        fields = ('id', 'name', 'color', 'color_name', 'slug')
+
+    def get_color_name(self, obj):
+        """Название цвета или None, если в базе остался цвет,
+        который не удалось привести к #rrggbb."""
+        try:
+            return hex_to_name(obj.color)
+        except ValueError:
+            return None
 
 
 class IngredientCreateSerializer(serializers.ModelSerializer):
@@ -119,10 +137,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     ingredients = IngredientCreateSerializer(
         many=True, source='recipeingredient'
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = TagPrimaryKeyField(many=True)
     image = Base64ImageField()
 
     class Meta:
@@ -134,19 +149,30 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         ingredients = validated_data.pop('recipeingredient')
         tags = validated_data.pop('tags')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        create_ingredient(ingredients, recipe)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            create_ingredient(ingredients, recipe)
         return recipe
 
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('recipeingredient')
         tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        super().update(instance, validated_data)
-        create_ingredient(ingredients, instance)
+        version = instance.version
+        try:
+            with transaction.atomic():
+                instance.version = version + 1
+                super().update(instance, validated_data)
+                update_tags(tags, instance)
+                if update_ingredients(ingredients, instance):
+                    transaction.on_commit(
+                        partial(bump_recipe_carts, instance.id)
+                    )
+        except Exception:
+            # Транзакция откатилась: версия в объекте должна
+            # совпадать с версией в БД.
+            instance.version = version
+            raise
         return instance
 
     def validate(self, data):
@@ -162,10 +188,21 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 'В рецепт нельзя добавить одинаковые ингредиенты!'
                 'Увеличьте количество!'
             )
+        existing = Ingredient.objects.in_bulk(ingredients_list)
+        missing = [pk for pk in ingredients_list if pk not in existing]
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': [
+                    f'Ингредиента с id={pk} не существует' for pk in missing
+                ]
+            })
         return data
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        instance = Recipe.objects.with_user_flags(
+            request.user
+        ).with_relations().get(pk=instance.pk)
         return RecipeGetRetrieveSerializer(
             instance,
             context={'request': request}
@@ -189,7 +226,7 @@ class RecipeIngredientGetSerializer(serializers.ModelSerializer):
 
 class RecipeGetRetrieveSerializer(serializers.ModelSerializer):
     """Сериализатор рецепта, используемый для выдачи информации о рецепте"""
-    tags = TagSerialiser(many=True, read_only=True)
+    tags = serializers.SerializerMethodField()
     author = UserGetRetrieveSerializer(read_only=True)
     ingredients = RecipeIngredientGetSerializer(
         many=True, read_only=True,
@@ -197,19 +234,47 @@ class RecipeGetRetrieveSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(required=False)
+    image_renditions = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart', 'name',
-                  'image', 'text', 'cooking_time')
+                  'image', 'image_renditions', 'text', 'cooking_time')
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'is_author_subscribed'):
+            instance.author.is_subscribed = instance.is_author_subscribed
+        return super().to_representation(instance)
+
+    def get_tags(self, obj):
+        representations = tag_registry.representations(TagSerialiser)
+        return [
+            representations[recipe_tag.tag_id]
+            for recipe_tag in obj.recipetag.all()
+            if recipe_tag.tag_id in representations
+        ]
+
+    def get_image_renditions(self, obj):
+        """Ссылки на уменьшенные копии картинки. Пока фоновый
+        обработчик их не создал, словарь пустой."""
+        request = self.context.get('request')
+        urls = {}
+        for name, path in obj.image_renditions.items():
+            url = obj.image.storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request.user.is_authenticated and Favourite.objects.filter(
                 user=request.user, recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and ShoppingCart.objects.filter(
@@ -285,6 +350,8 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
                   'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return (
             self.context.get('request').user.is_authenticated
             and Subscription.objects.filter(user=self.context['request'].user,
@@ -292,15 +359,16 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         )
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        recipes_limit = None
-        if request:
-            recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit:
-            recipes = obj.recipes.all()[:int(recipes_limit)]
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.recipes.all()[:get_int_query_param(
+                request, 'recipes_limit'
+            )]
         return ShortRecipeSerializer(recipes, many=True,
                                      context={'request': request}).data
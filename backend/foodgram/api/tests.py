@@ -0,0 +1,660 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import (TestCase, TransactionTestCase, override_settings,
+                         skipUnlessDBFeature)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.serializers import RecipeCreateSerializer
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag, TrendingWatermark)
+from recipes.similarity import similarity_index
+from recipes.tag_registry import tag_registry
+from recipes.trending import process_events
+from users.models import Subscription, User
+
+INGREDIENTS_URL = '/api/ingredients/'
+RECIPES_URL = '/api/recipes/'
+RECIPE_URL = '/api/recipes/{pk}/'
+TAGS_URL = '/api/tags/'
+MEDIA_ROOT = tempfile.mkdtemp()
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def image_data():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), 'white').save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def write_queries(context):
+    return [
+        query['sql'] for query in context.captured_queries
+        if query['sql'].lstrip().upper().startswith(WRITE_STATEMENTS)
+    ]
+
+
+class RecipeFixturesMixin:
+    """Пользователи, тэги, ингредиенты и рецепты для тестов API."""
+
+    @classmethod
+    def create_user(cls, username):
+        return User.objects.create_user(
+            username=username, email=f'{username}@example.com',
+            first_name=username, last_name=username, password='password'
+        )
+
+    @classmethod
+    def create_fixtures(cls):
+        cls.user = cls.create_user('reader')
+        cls.authors = [cls.create_user(f'author{i}') for i in range(3)]
+        cls.tags = [
+            Tag.objects.create(name=slug, color=color, slug=slug)
+            for slug, color in (('breakfast', '#ff0000'),
+                                ('lunch', '#00ff00'),
+                                ('dinner', '#0000ff'))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{i}',
+                                      measurement_unit='g')
+            for i in range(5)
+        ]
+        Subscription.objects.create(user=cls.user, author=cls.authors[0])
+
+    @classmethod
+    def create_recipes(cls, count, tags=None):
+        """Создает count рецептов с двумя тэгами и тремя ингредиентами.
+        Каждый второй рецепт в избранном и в корзине у cls.user."""
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=cls.authors[i % len(cls.authors)],
+                name=f'recipe{i}', text='text', cooking_time=10,
+            )
+            recipe_tags = tags or cls.tags[i % 2:i % 2 + 2]
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in recipe_tags
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=i + 1)
+                for ingredient in cls.ingredients[i % 3:i % 3 + 3]
+            )
+            if i % 2 == 0:
+                Favourite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+            recipes.append(recipe)
+        return recipes
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def payload(self, name):
+        """Данные для PATCH self.recipe с текущими тэгами
+        и ингредиентами и новым названием."""
+        return {
+            'ingredients': [
+                {'id': pk, 'amount': amount}
+                for pk, amount in RecipeIngredient.objects.filter(
+                    recipe=self.recipe
+                ).values_list('ingredient_id', 'amount')
+            ],
+            'tags': list(self.recipe.tags.values_list('id', flat=True)),
+            'name': name,
+            'text': 'text',
+            'cooking_time': 10,
+        }
+
+
+class RecipeListQueriesTest(RecipeFixturesMixin, TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы:
+    флаги избранного, корзины и подписки приходят аннотациями."""
+    # COUNT(*), рецепты с флагами и автором, тэги рецептов,
+    # ингредиенты рецептов, справочник тэгов.
+    LIST_QUERIES = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+    def assert_list_queries(self, recipes_count):
+        self.create_recipes(recipes_count)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(RECIPES_URL, {'limit': 10})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), recipes_count)
+        return results
+
+    def test_one_recipe(self):
+        self.assert_list_queries(1)
+
+    def test_many_recipes(self):
+        results = self.assert_list_queries(10)
+        recipes = {recipe.name: recipe for recipe in Recipe.objects.all()}
+        for result in results:
+            recipe = recipes[result['name']]
+            in_lists = int(result['name'][len('recipe'):]) % 2 == 0
+            self.assertIs(result['is_favorited'], in_lists)
+            self.assertIs(result['is_in_shopping_cart'], in_lists)
+            self.assertIs(
+                result['author']['is_subscribed'],
+                recipe.author_id == self.authors[0].id
+            )
+
+    def test_limit_50(self):
+        """Автор, тэги и ингредиенты с ингредиентами загружаются
+        фиксированным числом запросов, без N+1 по связям."""
+        self.create_recipes(50)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(RECIPES_URL, {'limit': 50})
+        results = response.json()['results']
+        self.assertEqual(len(results), 50)
+        for result in results:
+            self.assertEqual(len(result['tags']), 2)
+            self.assertEqual(len(result['ingredients']), 3)
+            self.assertTrue(result['author']['username'])
+
+    def test_anonymous(self):
+        self.create_recipes(10)
+        self.client.force_authenticate(None)
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(RECIPES_URL, {'limit': 10})
+        for result in response.json()['results']:
+            self.assertIs(result['is_favorited'], False)
+            self.assertIs(result['is_in_shopping_cart'], False)
+            self.assertIs(result['author']['is_subscribed'], False)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteQueriesTest(RecipeFixturesMixin, TestCase):
+    """Создание и изменение рецепта пишут в БД только то, что
+    изменилось, и не зависят от числа ингредиентов и тэгов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        cls.recipe = cls.create_recipes(1)[0]
+        cls.recipe.author = cls.user
+        cls.recipe.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def payload(self, amounts, tags):
+        """Данные рецепта; amounts - словарь id ингредиента -> количество."""
+        return {
+            'ingredients': [
+                {'id': pk, 'amount': amount} for pk, amount in amounts.items()
+            ],
+            'tags': [tag.id for tag in tags],
+            'name': 'recipe',
+            'text': 'text',
+            'cooking_time': 10,
+        }
+
+    def patch(self, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                RECIPE_URL.format(pk=self.recipe.pk), data, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        return write_queries(context)
+
+    def current_amounts(self):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_create(self):
+        """Рецепт, его тэги и ингредиенты - по одному INSERT."""
+        data = self.payload(
+            {ingredient.id: 1 for ingredient in self.ingredients}, self.tags
+        )
+        data['image'] = image_data()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(RECIPES_URL, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        writes = write_queries(context)
+        self.assertEqual(len(writes), 3, writes)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.recipeingredient.count(), 5)
+        self.assertEqual(recipe.recipetag.count(), 3)
+
+    def test_update_unchanged_ingredients(self):
+        """Тэги и ингредиенты не менялись: пишется только рецепт."""
+        amounts = self.current_amounts()
+        writes = self.patch(self.payload(amounts, self.recipe.tags.all()))
+        self.assertEqual(len(writes), 1, writes)
+        self.assertTrue(writes[0].startswith('UPDATE "recipes_recipe"'))
+        self.assertEqual(self.current_amounts(), amounts)
+
+    def test_update_one_amount(self):
+        """Изменилось одно количество: рецепт и один UPDATE
+        ингредиентов, без удаления и повторной вставки."""
+        amounts = self.current_amounts()
+        changed = next(iter(amounts))
+        amounts[changed] += 10
+        writes = self.patch(self.payload(amounts, self.recipe.tags.all()))
+        self.assertEqual(len(writes), 2, writes)
+        self.assertFalse(any(sql.startswith(('INSERT', 'DELETE'))
+                             for sql in writes))
+        self.assertEqual(self.current_amounts(), amounts)
+
+    def test_update_changed_ingredients(self):
+        """Один ингредиент убран, один добавлен, один изменен,
+        тэг заменен: по одному запросу на каждый вид изменения."""
+        amounts = self.current_amounts()
+        removed, changed, _ = amounts
+        added = next(
+            ingredient.id for ingredient in self.ingredients
+            if ingredient.id not in amounts
+        )
+        del amounts[removed]
+        amounts[changed] += 10
+        amounts[added] = 7
+        current_tags = set(self.recipe.tags.all())
+        tags = [next(tag for tag in self.tags if tag not in current_tags),
+                *list(current_tags)[1:]]
+        writes = self.patch(self.payload(amounts, tags))
+        # Рецепт; DELETE и INSERT тэгов; DELETE, UPDATE и INSERT
+        # ингредиентов.
+        self.assertEqual(len(writes), 6, writes)
+        self.assertEqual(self.current_amounts(), amounts)
+        self.assertEqual(set(self.recipe.tags.all()), set(tags))
+
+
+class RecipeVersionTest(RecipeFixturesMixin, TestCase):
+    """PATCH увеличивает версию рецепта, а если изменение не удалось,
+    версия не меняется ни в БД, ни в объекте."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        cls.recipe = cls.create_recipes(1)[0]
+        cls.recipe.author = cls.user
+        cls.recipe.save()
+
+    def test_version_bumped(self):
+        url = RECIPE_URL.format(pk=self.recipe.pk)
+        etag = self.client.get(url)['ETag']
+        response = self.client.patch(
+            url, self.payload('first'), format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        version = self.recipe.version + 1
+        self.assertEqual(response['ETag'],
+                         f'"recipe-{self.recipe.pk}-{version}"')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, version)
+        self.assertEqual(self.recipe.name, 'first')
+
+    def test_stale_if_match(self):
+        url = RECIPE_URL.format(pk=self.recipe.pk)
+        stale = f'"recipe-{self.recipe.pk}-{self.recipe.version - 1}"'
+        response = self.client.patch(
+            url, self.payload('first'), format='json', HTTP_IF_MATCH=stale
+        )
+        self.assertEqual(response.status_code, 412)
+        version = self.recipe.version
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.version, version)
+        self.assertEqual(self.recipe.name, 'recipe0')
+
+    def test_version_kept_on_error(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        version = recipe.version
+        with mock.patch('api.serializers.update_tags',
+                        side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                RecipeCreateSerializer().update(recipe, {
+                    'recipeingredient': [], 'tags': [], 'name': 'first',
+                })
+        self.assertEqual(recipe.version, version)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.version, version)
+        self.assertEqual(recipe.name, 'recipe0')
+
+
+class RecipeConcurrentUpdateTest(RecipeFixturesMixin, TransactionTestCase):
+    """PATCH с устаревшим If-Match получает 412, а параллельные
+    изменения рецепта не затирают друг друга."""
+
+    def setUp(self):
+        self.create_fixtures()
+        self.recipe = self.create_recipes(1)[0]
+        self.recipe.author = self.user
+        self.recipe.save()
+        super().setUp()
+
+    def get_etag(self):
+        response = self.client.get(RECIPE_URL.format(pk=self.recipe.pk))
+        return response['ETag']
+
+    def test_stale_if_match(self):
+        etag = self.get_etag()
+        url = RECIPE_URL.format(pk=self.recipe.pk)
+        response = self.client.patch(
+            url, self.payload('first'), format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.patch(
+            url, self.payload('second'), format='json', HTTP_IF_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 412)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'first')
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_parallel_updates(self):
+        """Два редактора одновременно отправляют PATCH с одним
+        If-Match. Блокировка строки рецепта пропускает их по очереди:
+        первый сохраняет изменения, второй видит новую версию."""
+        etag = self.get_etag()
+        url = RECIPE_URL.format(pk=self.recipe.pk)
+        payloads = {name: self.payload(name) for name in ('first', 'second')}
+        barrier = threading.Barrier(len(payloads))
+        statuses = {}
+
+        def update(name):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            try:
+                barrier.wait()
+                statuses[name] = client.patch(
+                    url, payloads[name], format='json', HTTP_IF_MATCH=etag
+                ).status_code
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=update, args=(name,))
+            for name in payloads
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(statuses.values()), [200, 412])
+        winner = next(
+            name for name, status in statuses.items() if status == 200
+        )
+        version = self.recipe.version
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, winner)
+        self.assertEqual(self.recipe.version, version + 1)
+
+
+class RecipeTagFilterTest(RecipeFixturesMixin, TestCase):
+    """Фильтр по тэгам: любой из тэгов или все тэги, без дублей
+    и без лишних запросов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        breakfast, lunch, dinner = cls.tags
+        for name, tags in (('breakfast', [breakfast]),
+                           ('breakfast-lunch', [breakfast, lunch]),
+                           ('lunch', [lunch]),
+                           ('all', [breakfast, lunch, dinner]),
+                           ('dinner', [dinner])):
+            recipe = cls.create_recipes(1, tags=tags)[0]
+            recipe.name = name
+            recipe.save()
+
+    def get_names(self, params,
+                  queries=RecipeListQueriesTest.LIST_QUERIES):
+        with self.assertNumQueries(queries) as context:
+            response = self.client.get(RECIPES_URL, params)
+        self.assertEqual(response.status_code, 200)
+        for query in context.captured_queries:
+            self.assertNotIn('JOIN "recipes_recipetag"', query['sql'])
+        data = response.json()
+        names = [result['name'] for result in data['results']]
+        self.assertEqual(data['count'], len(names))
+        self.assertEqual(len(names), len(set(names)))
+        return set(names)
+
+    def test_any(self):
+        self.assertEqual(
+            self.get_names({'tags': ['breakfast', 'lunch']}),
+            {'breakfast', 'breakfast-lunch', 'lunch', 'all'}
+        )
+
+    def test_any_mode(self):
+        self.assertEqual(
+            self.get_names({'tags': ['breakfast', 'lunch'],
+                            'tags_mode': 'any'}),
+            {'breakfast', 'breakfast-lunch', 'lunch', 'all'}
+        )
+
+    def test_tag_map_is_cached(self):
+        """Слаги берутся из справочника тэгов в памяти: он загружается
+        одним запросом на первый запрос, дальше тэги не читаются."""
+        self.get_names({'tags': ['breakfast']})
+        self.assertEqual(
+            self.get_names({'tags': ['lunch']},
+                           RecipeListQueriesTest.LIST_QUERIES - 1),
+            {'breakfast-lunch', 'lunch', 'all'}
+        )
+
+    def test_all(self):
+        self.assertEqual(
+            self.get_names({'tags': ['breakfast', 'lunch'],
+                            'tags_mode': 'all'}),
+            {'breakfast-lunch', 'all'}
+        )
+
+    def test_all_single_tag(self):
+        self.assertEqual(
+            self.get_names({'tags': ['dinner'], 'tags_mode': 'all'}),
+            {'all', 'dinner'}
+        )
+
+    def test_unknown_slug(self):
+        response = self.client.get(RECIPES_URL, {'tags': ['brunch']})
+        self.assertEqual(response.status_code, 400)
+
+
+class TrendingEventsTest(RecipeFixturesMixin, TestCase):
+    """Событие моложе TRENDING_LAG задерживает отметку обработки,
+    но не теряется, даже если за ним идут более старые события."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        cls.recipes = cls.create_recipes(3)
+        Favourite.objects.all().delete()
+        ShoppingCart.objects.all().delete()
+
+    def favourite(self, recipe, created):
+        favourite = Favourite.objects.create(user=self.user, recipe=recipe)
+        Favourite.objects.filter(pk=favourite.pk).update(created=created)
+        return favourite
+
+    def process(self, now):
+        with mock.patch('recipes.trending.timezone.now', return_value=now):
+            return process_events(batch_size=100)
+
+    def test_young_event_holds_watermark(self):
+        now = timezone.now()
+        old = now - timedelta(seconds=settings.TRENDING_LAG * 2)
+        first = self.favourite(self.recipes[0], old)
+        self.favourite(self.recipes[1], now)
+        # Строка с большим id, но меньшим created: например, часы
+        # на разных серверах приложения расходятся.
+        last = self.favourite(self.recipes[2], old)
+
+        self.assertEqual(self.process(now), 1)
+        watermark = TrendingWatermark.objects.get(source='favourite')
+        self.assertEqual(watermark.last_id, first.pk)
+
+        later = now + timedelta(seconds=settings.TRENDING_LAG * 2)
+        self.assertEqual(self.process(later), 2)
+        watermark.refresh_from_db()
+        self.assertEqual(watermark.last_id, last.pk)
+        self.assertEqual(
+            Recipe.objects.filter(trending_score__isnull=False).count(), 3
+        )
+
+
+@override_settings(SIMILARITY_INDEX_PATH=os.path.join(MEDIA_ROOT, 'none.npz'))
+class SimilarityIndexTest(RecipeFixturesMixin, TestCase):
+    """Индекс похожих рецептов сверяет отпечаток БД по возрасту
+    и видит изменения, о которых журнал в кэше не сообщил."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+        cls.recipes = cls.create_recipes(3)
+
+    def setUp(self):
+        super().setUp()
+        similarity_index.invalidate()
+
+    def similar(self):
+        return similarity_index.similar(self.recipes[0].id, 10)
+
+    def test_recheck_by_age(self):
+        first, second, third = self.recipes
+        self.assertEqual(self.similar(), [second.id, third.id])
+        # bulk_create не вызывает сигналы: так выглядят изменения
+        # из другого процесса при локальном кэше.
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=third, ingredient=ingredient, amount=1)
+            for ingredient in self.ingredients[:2]
+        )
+        self.assertEqual(self.similar(), [second.id, third.id])
+        expired = time.monotonic() + settings.SIMILARITY_INDEX_MAX_AGE + 1
+        with mock.patch('recipes.similarity.time.monotonic',
+                        return_value=expired):
+            self.assertEqual(self.similar(), [third.id, second.id])
+
+    def test_recheck_keeps_unchanged_index(self):
+        self.similar()
+        index = similarity_index.get()
+        expired = time.monotonic() + settings.SIMILARITY_INDEX_MAX_AGE + 1
+        with mock.patch('recipes.similarity.time.monotonic',
+                        return_value=expired):
+            with self.assertNumQueries(1):
+                self.assertIs(similarity_index.get(), index)
+        self.assertEqual(index.checked_at, expired)
+
+
+class TagRegistryTest(TestCase):
+    """Справочник тэгов перезагружается по возрасту, даже если версия
+    в кэше не изменилась, а ETag зависит только от содержимого."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name='breakfast', color='#ff0000',
+                                     slug='breakfast')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_tags(self):
+        response = self.client.get(TAGS_URL)
+        self.assertEqual(response.status_code, 200)
+        return [tag['name'] for tag in response.json()], response['ETag']
+
+    def test_reload_by_age(self):
+        names, etag = self.get_tags()
+        # Изменение без сигналов: так его видит процесс, до которого
+        # не дошла новая версия из локального кэша другого процесса.
+        Tag.objects.filter(pk=self.tag.pk).update(name='brunch')
+        self.assertEqual(self.get_tags(), (names, etag))
+        expired = time.monotonic() + settings.TAG_REGISTRY_MAX_AGE + 1
+        with mock.patch('recipes.tag_registry.time.monotonic',
+                        return_value=expired):
+            new_names, new_etag = self.get_tags()
+        self.assertEqual(new_names, ['brunch'])
+        self.assertNotEqual(new_etag, etag)
+
+    def test_etag_depends_on_content(self):
+        _, etag = self.get_tags()
+        cache.clear()
+        tag_registry.invalidate()
+        self.assertEqual(self.get_tags()[1], etag)
+
+
+class IngredientSearchTest(TestCase):
+    """Поиск ингредиентов по ?name=: сначала совпадения по префиксу,
+    затем по подстроке, внутри групп - по названию без учета регистра.
+    Индекс в памяти и запрос к БД дают одинаковый порядок."""
+    NAMES = ('Salt', 'sea salt', 'SALTED butter', 'Zest salt',
+             'anchovy salt', 'basalt', 'Sugar', 'salsa')
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='g') for name in cls.NAMES
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, in_memory, **params):
+        with override_settings(INGREDIENT_SEARCH_IN_MEMORY=in_memory):
+            return self.client.get(INGREDIENTS_URL, params)
+
+    def names(self, in_memory, **params):
+        response = self.search(in_memory, **params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_ranked_order(self):
+        expected = ['Salt', 'SALTED butter', 'anchovy salt', 'basalt',
+                    'sea salt', 'Zest salt']
+        for in_memory in (True, False):
+            with self.subTest(in_memory=in_memory):
+                self.assertEqual(
+                    self.names(in_memory, name='salt'), expected
+                )
+
+    def test_paths_agree(self):
+        for term in ('s', 'SA', 'alt', 'salt', 'Z', 'xyz'):
+            with self.subTest(term=term):
+                self.assertEqual(
+                    self.names(True, name=term),
+                    self.names(False, name=term)
+                )
+
+    def test_limit(self):
+        for in_memory in (True, False):
+            with self.subTest(in_memory=in_memory):
+                self.assertEqual(
+                    self.names(in_memory, name='salt', limit=3),
+                    ['Salt', 'SALTED butter', 'anchovy salt']
+                )
+
+    def test_invalid_limit(self):
+        for in_memory in (True, False):
+            for limit in ('0', '-1', 'ten'):
+                with self.subTest(in_memory=in_memory, limit=limit):
+                    response = self.search(in_memory, name='salt',
+                                           limit=limit)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('limit', response.json())
@@ -1,46 +1,27 @@
-import webcolors
-from django.shortcuts import HttpResponse
-from django.utils import timezone
+from collections import defaultdict
+
+from django.db import transaction
 from rest_framework import response, serializers, status
 from rest_framework.generics import get_object_or_404
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.colors import to_hex
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
 
 
 class Hex2NameColor(serializers.Field):
+    """Цвет в виде #rrggbb. На вход принимает также #rgb
+    и названия цветов CSS3."""
 
     def to_representation(self, value):
         return value
 
     def to_internal_value(self, data):
+        if not isinstance(data, str):
+            raise serializers.ValidationError('Цвет должен быть строкой')
         try:
-            return webcolors.hex_to_name(data)
+            return to_hex(data)
         except ValueError:
-            raise serializers.ValidationError('Для этого цвета нет имени')
-
-
-def list_ingredients(self, request, ingredients):
-    user = self.request.user
-    filename = f'{user.username}_shopping_list.txt'
-
-    today = timezone.now().today()
-    shopping_list = (
-        f'Список покупок пользователя: {user.username}\n\n'
-        f'Дата: {today:%Y-%m-%d}\n\n'
-    )
-    shopping_list += '\n'.join([
-        f'- {ingredient["ingredient__name"]} '
-        f'({ingredient["ingredient__measurement_unit"]})'
-        f' - {ingredient["final_amount"]}'
-        for ingredient in ingredients
-    ])
-    shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-    response = HttpResponse(
-        shopping_list, content_type='text.txt; charset=utf-8'
-    )
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-    return response
+            raise serializers.ValidationError('Неизвестный цвет')
 
 
 def post_or_delete(request, pk, model, serializer_name):
@@ -50,7 +31,8 @@ def post_or_delete(request, pk, model, serializer_name):
     serializer = serializer_name(data=data, context={'request': request})
     if request.method == 'POST':
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return response.Response(serializer.data,
                                  status=status.HTTP_201_CREATED)
     get_object_or_404(
@@ -60,16 +42,103 @@ def post_or_delete(request, pk, model, serializer_name):
 
 
 def create_ingredient(ingredients, recipe):
-    ingredient_list = []
+    """Создает ингредиенты рецепта одним запросом. Существование
+    ингредиентов проверяется при валидации рецепта."""
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient_id=ingredient.get('id'),
+            amount=ingredient.get('amount')
+        )
+        for ingredient in ingredients
+    )
+
+
+def update_ingredients(ingredients, recipe):
+    """Приводит ингредиенты рецепта к переданному списку: удаляет
+    лишние, добавляет новые и обновляет только изменившиеся
+    количества. Возвращает True, если что-то изменилось."""
+    current = {
+        item.ingredient_id: item
+        for item in RecipeIngredient.objects.filter(recipe=recipe)
+    }
+    to_create = []
+    to_update = []
     for ingredient in ingredients:
-        current_ingredient = get_object_or_404(Ingredient,
-                                               id=ingredient.get('id'))
-        amount = ingredient.get('amount')
-        ingredient_list.append(
-            RecipeIngredient(
+        item = current.pop(ingredient.get('id'), None)
+        if item is None:
+            to_create.append(RecipeIngredient(
                 recipe=recipe,
-                ingredient=current_ingredient,
-                amount=amount
-            )
+                ingredient_id=ingredient.get('id'),
+                amount=ingredient.get('amount')
+            ))
+        elif item.amount != ingredient.get('amount'):
+            item.amount = ingredient.get('amount')
+            to_update.append(item)
+    if current:
+        RecipeIngredient.objects.filter(
+            id__in=[item.id for item in current.values()]
+        ).delete()
+    if to_update:
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+    if to_create:
+        RecipeIngredient.objects.bulk_create(to_create)
+    return bool(current or to_update or to_create)
+
+
+def update_tags(tags, recipe):
+    """Добавляет и удаляет только отличающиеся тэги рецепта."""
+    current = set(
+        RecipeTag.objects.filter(recipe=recipe).values_list('tag_id',
+                                                            flat=True)
+    )
+    new = {tag.id for tag in tags}
+    if current - new:
+        RecipeTag.objects.filter(
+            recipe=recipe, tag_id__in=current - new
+        ).delete()
+    if new - current:
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=pk) for pk in new - current
         )
-    RecipeIngredient.objects.bulk_create(ingredient_list)
+
+
+def attach_recipes_preview(authors, limit=None):
+    """Подгружает авторам последние рецепты одним запросом
+    и сохраняет их в атрибут recipes_preview."""
+    previews = defaultdict(list)
+    for recipe in Recipe.objects.latest_by_authors(
+            [author.id for author in authors], limit):
+        previews[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recipes_preview = previews[author.id]
+
+
+def get_int_query_param(request, name, min_value=0):
+    """Возвращает целочисленный параметр запроса или None,
+    если параметр не передан."""
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return serializers.IntegerField(
+            min_value=min_value
+        ).run_validation(value)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({name: error.detail})
+
+
+def get_int_list_query_param(request, name):
+    """Возвращает список целых чисел из повторяющегося параметра
+    запроса или значений через запятую: ?name=1&name=2 или ?name=1,2."""
+    values = [
+        value
+        for item in request.query_params.getlist(name)
+        for value in item.split(',') if value
+    ]
+    try:
+        return serializers.ListField(
+            child=serializers.IntegerField(min_value=1)
+        ).run_validation(values)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({name: error.detail})
@@ -1,23 +1,41 @@
-from django.db.models import Sum
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Count, Sum, Value
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_etags, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from recipes.cache import get_cart_version
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.similarity import similarity_index
+from recipes.tag_registry import tag_registry
+from recipes.trending import get_top
 from users.models import Subscription, User
-from .filters import IngredientFilter, RecipeFilter
+from .exceptions import PreconditionFailed
+from .exporters import EXPORTERS
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .pagination import KeysetPagination, RecipePagination
 from .permissions import IsAdminAuthorOrReadOnly
+from .renderers import (CSVShoppingListRenderer, JSONShoppingListRenderer,
+                        PDFShoppingListRenderer, TextShoppingListRenderer)
 from .serializers import (FavouriteSerializer, IngredientGetRetrieveSerializer,
                           RecipeCreateSerializer, RecipeGetRetrieveSerializer,
                           ShoppingCartSerializer, SubscriptionsSerializer,
                           TagSerialiser, UserGetRetrieveSerializer,
                           UserSubscribeSerializer)
-from .utils import list_ingredients, post_or_delete
+from .utils import (attach_recipes_preview, get_int_list_query_param,
+                    get_int_query_param, post_or_delete)
 
 
 class UserViewSet(UserViewSet):
@@ -48,8 +66,15 @@ class UserViewSet(UserViewSet):
             url_name='subscriptions',
             permission_classes=[IsAuthenticated],)
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        recipes_limit = get_int_query_param(request, 'recipes_limit')
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
+        attach_recipes_preview(page, recipes_limit)
         serializer = SubscriptionsSerializer(page, many=True,
                                              context={'request': request})
         return self.get_paginated_response(serializer.data)
@@ -62,6 +87,33 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny, )
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        digest = tag_registry.digest
+        tags = tag_registry.representations(self.serializer_class)
+        return self.cached_response(request, digest, list(tags.values()))
+
+    def retrieve(self, request, *args, **kwargs):
+        digest = tag_registry.digest
+        tags = tag_registry.representations(self.serializer_class)
+        try:
+            tag = tags[int(kwargs['pk'])]
+        except (KeyError, ValueError):
+            raise NotFound
+        return self.cached_response(request, digest, tag)
+
+    def cached_response(self, request, digest, data):
+        """Ответ с ETag по содержимому справочника тэгов
+        и Cache-Control."""
+        etag = quote_etag(f'tags-{digest}')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.TAGS_CACHE_MAX_AGE
+        )
+        return response
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Получение ингредиента/списка ингредиентов"""
@@ -73,15 +125,72 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ('^name', )
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = get_int_query_param(request, 'limit', min_value=1)
+        if settings.INGREDIENT_SEARCH_IN_MEMORY:
+            ingredients = ingredient_index.search(name, limit=limit)
+        else:
+            ingredients = self.filter_queryset(self.get_queryset())[:limit]
+        serializer = self.get_serializer(ingredients, many=True)
+        return Response(serializer.data)
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
-    filter_backends = (DjangoFilterBackend, )
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('favourites_count',)
+    pagination_class = RecipePagination
     permission_classes = (IsAdminAuthorOrReadOnly, )
     http_method_names = ['get', 'post', 'patch', 'delete']
 
+    def get_queryset(self):
+        if self.action == 'partial_update':
+            return Recipe.objects.select_for_update()
+        queryset = Recipe.objects.with_user_flags(self.request.user)
+        if self.action in ('list', 'retrieve', 'feed', 'trending',
+                           'similar', 'cook_with'):
+            return queryset.with_relations()
+        return queryset
+
+    def get_object(self):
+        recipe = super().get_object()
+        if self.action == 'partial_update':
+            if_match = self.request.headers.get('If-Match')
+            if if_match and not {'*', get_recipe_etag(recipe)} & set(
+                    parse_etags(if_match)):
+                raise PreconditionFailed()
+        return recipe
+
+    def retrieve(self, request, *args, **kwargs):
+        recipe = self.get_object()
+        serializer = self.get_serializer(recipe)
+        return Response(serializer.data,
+                        headers={'ETag': get_recipe_etag(recipe)})
+
+    def perform_create(self, serializer):
+        serializer.save()
+        self.recipe_etag = get_recipe_etag(serializer.instance)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.recipe_etag = get_recipe_etag(serializer.instance)
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response['ETag'] = self.recipe_etag
+        return response
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.recipe_etag
+        return response
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeGetRetrieveSerializer
@@ -99,17 +208,112 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        renderer_classes=[TextShoppingListRenderer, CSVShoppingListRenderer,
+                          JSONShoppingListRenderer, PDFShoppingListRenderer]
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shoppingcart__user=self.request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).order_by('ingredient__name').annotate(
-            final_amount=Sum('amount'))
-        return list_ingredients(self, request, ingredients)
+        exporter = EXPORTERS[request.accepted_renderer.format]
+        version = get_cart_version(request.user.id)
+        etag = quote_etag(hashlib.md5(
+            f'{request.user.id}:{version}:{exporter.format}'.encode()
+        ).hexdigest())
+        last_modified = int(version)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            ingredients = RecipeIngredient.objects.filter(
+                recipe__shoppingcart__user=self.request.user
+            ).values(
+                'ingredient__name',
+                'ingredient__measurement_unit'
+            ).order_by('ingredient__name').annotate(
+                final_amount=Sum('amount'))
+            response = exporter(request.user, ingredients).response(
+                cache_key=f'shopping_list:{etag}'
+            )
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny, ],
+        pagination_class=None
+    )
+    def trending(self, request):
+        """Самые популярные рецепты за последнее время по данным
+        update_trending, без пагинации, не больше limit штук."""
+        limit = get_int_query_param(request, 'limit', min_value=1)
+        limit = min(limit or settings.REST_FRAMEWORK['PAGE_SIZE'],
+                    settings.TRENDING_TOP_K)
+        recipe_ids = [recipe_id for _, recipe_id in get_top()[:limit]]
+        return self.ranked_response(request, recipe_ids)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[AllowAny, ],
+        pagination_class=None
+    )
+    def similar(self, request, pk):
+        """Рецепты с наиболее похожим набором ингредиентов."""
+        recipe = get_object_or_404(Recipe.objects.only('id'), pk=pk)
+        limit = self.get_similarity_limit(request)
+        return self.ranked_response(
+            request, similarity_index.similar(recipe.id, limit)
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny, ],
+        pagination_class=None
+    )
+    def cook_with(self, request):
+        """Рецепты, которые можно приготовить из ингредиентов
+        ?ingredients=, если докупить не больше ?missing= продуктов."""
+        ingredient_ids = get_int_list_query_param(request, 'ingredients')
+        missing = get_int_query_param(request, 'missing') or 0
+        limit = self.get_similarity_limit(request)
+        return self.ranked_response(
+            request,
+            similarity_index.cook_with(ingredient_ids, limit, missing)
+        )
+
+    def get_similarity_limit(self, request):
+        limit = get_int_query_param(request, 'limit', min_value=1)
+        return min(limit or settings.REST_FRAMEWORK['PAGE_SIZE'],
+                   settings.SIMILARITY_MAX_LIMIT)
+
+    def ranked_response(self, request, recipe_ids):
+        """Сериализует рецепты одним запросом в порядке recipe_ids,
+        пропуская уже удаленные."""
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = RecipeGetRetrieveSerializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated, ],
+        pagination_class=KeysetPagination
+    )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        queryset = self.get_queryset().filter(
+            feed_entries__user=request.user
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = RecipeGetRetrieveSerializer(
+            page, many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -120,3 +324,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return post_or_delete(
             request, pk, Favourite, FavouriteSerializer
         )
+
+
+def get_recipe_etag(recipe):
+    return quote_etag(f'recipe-{recipe.pk}-{recipe.version}')
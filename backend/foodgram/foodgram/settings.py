@@ -59,6 +59,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 DATABASES = {
     'default': {
         'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
@@ -134,3 +143,75 @@ STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_LIST_CACHE_MAX_SIZE = 1024 * 1024
+
+INGREDIENT_SEARCH_IN_MEMORY = (
+    os.getenv('INGREDIENT_SEARCH_IN_MEMORY', 'True') == 'True'
+)
+
+INGREDIENT_INDEX_MAX_AGE = 60
+
+FEED_BACKFILL_LIMIT = 1000
+
+RECIPE_COUNT_CACHE_TIMEOUT = 60
+
+RECIPE_COUNT_ESTIMATE_THRESHOLD = (
+    int(os.getenv('RECIPE_COUNT_ESTIMATE_THRESHOLD'))
+    if os.getenv('RECIPE_COUNT_ESTIMATE_THRESHOLD') else None
+)
+
+TAGS_CACHE_MAX_AGE = 60
+
+TAG_REGISTRY_MAX_AGE = 60
+
+COLOR_NAME_CACHE_SIZE = 4096
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+IMAGE_RENDITIONS = {
+    'thumbnail': {
+        'size': (320, 320), 'format': 'JPEG', 'extension': 'jpg',
+        'quality': 80,
+    },
+    'webp': {
+        'size': (1280, 1280), 'format': 'WEBP', 'extension': 'webp',
+        'quality': 80,
+    },
+}
+
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+
+TRENDING_EPOCH = 1672531200
+
+TRENDING_WEIGHTS = {'favourite': 1.0, 'shopping_cart': 0.5}
+
+TRENDING_LAG = 60
+
+TRENDING_TOP_K = 1000
+
+TRENDING_TOP_CACHE_TIMEOUT = 60
+
+SIMILARITY_NUM_PERM = 64
+
+SIMILARITY_CANDIDATES_FACTOR = 16
+
+SIMILARITY_LOG_TIMEOUT = 24 * 60 * 60
+
+SIMILARITY_INDEX_PATH = os.getenv(
+    'SIMILARITY_INDEX_PATH', os.path.join(BASE_DIR, 'similarity_index.npz')
+)
+
+SIMILARITY_MAX_LIMIT = 100
+
+SIMILARITY_INDEX_MAX_AGE = 300
@@ -14,12 +14,13 @@ class TagAdmin(admin.ModelAdmin):
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author',)
+    list_display = ('name', 'author', 'in_favorites')
     list_filter = ('author', 'name', 'tags',)
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном',
+                   ordering='favourites_count')
     def in_favorites(self, obj):
-        return obj.favorite_recipe.count()
+        return obj.favourites_count
 
 
 class RecipeIngredientAdmin(admin.ModelAdmin):
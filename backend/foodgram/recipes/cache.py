@@ -0,0 +1,60 @@
+import time
+
+from django.core.cache import cache
+
+CART_VERSION_KEY = 'shopping_cart:{user_id}:version'
+INGREDIENTS_VERSION_KEY = 'ingredients:version'
+RECIPES_VERSION_KEY = 'recipes:version'
+TAGS_VERSION_KEY = 'tags:version'
+
+
+def get_version(key):
+    """Возвращает версию (время последнего изменения) по ключу кэша."""
+    version = cache.get(key)
+    if version is not None:
+        return version
+    cache.add(key, time.time(), None)
+    return cache.get(key)
+
+
+def get_cart_version(user_id):
+    """Версия корзины пользователя с учетом изменений справочника
+    ингредиентов."""
+    return max(
+        get_version(CART_VERSION_KEY.format(user_id=user_id)),
+        get_version(INGREDIENTS_VERSION_KEY),
+    )
+
+
+def bump_cart_versions(user_ids):
+    now = time.time()
+    cache.set_many(
+        {CART_VERSION_KEY.format(user_id=user_id): now
+         for user_id in user_ids},
+        None
+    )
+
+
+def bump_recipe_carts(recipe_id):
+    """Сбрасывает версии корзин всех пользователей,
+    у которых рецепт лежит в корзине."""
+    from .models import ShoppingCart
+
+    bump_cart_versions(
+        ShoppingCart.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('user_id', flat=True)
+    )
+
+
+def bump_ingredients_version():
+    cache.set(INGREDIENTS_VERSION_KEY, time.time(), None)
+
+
+def bump_recipes_version():
+    """Сбрасывает закэшированные размеры списков рецептов."""
+    cache.set(RECIPES_VERSION_KEY, time.time(), None)
+
+
+def bump_tags_version():
+    cache.set(TAGS_VERSION_KEY, time.time(), None)
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+import webcolors
+from django.conf import settings
+
+HEX_TO_NAME = dict(webcolors.CSS3_HEX_TO_NAMES)
+NAME_TO_HEX = dict(webcolors.CSS3_NAMES_TO_HEX)
+NAMED_RGB = tuple(
+    (tuple(webcolors.hex_to_rgb(hex_value)), name)
+    for hex_value, name in HEX_TO_NAME.items()
+)
+
+
+def to_hex(value):
+    """Приводит цвет в виде #rgb, #rrggbb или названия CSS3
+    к виду #rrggbb. Для неизвестного цвета - ValueError."""
+    value = value.strip().lower()
+    if value in NAME_TO_HEX:
+        return NAME_TO_HEX[value]
+    return webcolors.normalize_hex(value)
+
+
+@lru_cache(maxsize=settings.COLOR_NAME_CACHE_SIZE)
+def hex_to_name(hex_value):
+    """Название CSS3 для цвета #rrggbb. Если точного названия нет,
+    возвращается ближайший по евклидову расстоянию в RGB цвет."""
+    if hex_value in HEX_TO_NAME:
+        return HEX_TO_NAME[hex_value]
+    red, green, blue = webcolors.hex_to_rgb(hex_value)
+    return min(
+        NAMED_RGB,
+        key=lambda item: (
+            (item[0][0] - red) ** 2
+            + (item[0][1] - green) ** 2
+            + (item[0][2] - blue) ** 2
+        )
+    )[1]
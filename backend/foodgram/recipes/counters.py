@@ -0,0 +1,54 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .loaders import chunked
+from .models import Favourite, Recipe, ShoppingCart
+
+COUNTERS = {
+    Favourite: 'favourites_count',
+    ShoppingCart: 'in_carts_count',
+}
+BATCH_SIZE = 1000
+
+
+def change_counter(model, recipe_id, delta):
+    """Атомарно меняет счетчик рецепта выражением F()."""
+    field = COUNTERS[model]
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    if delta < 0:
+        recipes = recipes.filter(**{f'{field}__gte': -delta})
+    recipes.update(**{field: F(field) + delta})
+
+
+def actual_count(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe'
+        ).annotate(total=Count('id')).values('total')
+    ), Value(0))
+
+
+def reconcile(recipe_ids=None):
+    """Пересчитывает счетчики рецептов, которые разошлись с таблицами
+    избранного и корзин. Возвращает число исправленных рецептов."""
+    recipes = Recipe.objects.order_by()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    actual = {
+        f'actual_{field}': actual_count(model)
+        for model, field in COUNTERS.items()
+    }
+    drift = Q()
+    for field in COUNTERS.values():
+        drift |= ~Q(**{field: F(f'actual_{field}')})
+    ids = recipes.annotate(**actual).filter(drift).values_list(
+        'id', flat=True
+    )
+    fixed = 0
+    for batch in chunked(ids.iterator(), BATCH_SIZE):
+        Recipe.objects.filter(pk__in=batch).update(**{
+            field: actual_count(model)
+            for model, field in COUNTERS.items()
+        })
+        fixed += len(batch)
+    return fixed
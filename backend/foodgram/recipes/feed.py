@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+from django.conf import settings
+
+from users.models import Subscription
+from .loaders import chunked
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты всех подписчиков автора."""
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe=recipe,
+                   author_id=recipe.author_id)
+         for user_id in Subscription.objects.filter(
+             author_id=recipe.author_id).values_list('user_id', flat=True)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def backfill(subscriptions):
+    """Добавляет в ленты подписчиков не больше FEED_BACKFILL_LIMIT
+    последних рецептов каждого автора. subscriptions - пары
+    (user_id, author_id)."""
+    followers = defaultdict(list)
+    for user_id, author_id in subscriptions:
+        followers[author_id].append(user_id)
+    if not followers:
+        return
+    recipes = Recipe.objects.latest_by_authors(
+        followers, settings.FEED_BACKFILL_LIMIT
+    )
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                   author_id=recipe.author_id)
+         for recipe in recipes
+         for user_id in followers[recipe.author_id]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    """Убирает рецепты автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def rebuild():
+    """Заполняет ленты по всем подпискам. Нужна после массовой
+    загрузки данных, которая не вызывает сигналы."""
+    subscriptions = Subscription.objects.values_list(
+        'user_id', 'author_id'
+    ).iterator()
+    for batch in chunked(subscriptions, BATCH_SIZE):
+        backfill(batch)
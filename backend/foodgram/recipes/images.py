@@ -0,0 +1,88 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from PIL import Image
+
+from .models import Recipe
+
+RENDITIONS_DIR = 'recipes/renditions'
+MODES = {'JPEG': ('RGB', 'L'), 'WEBP': ('RGB', 'RGBA')}
+
+logger = logging.getLogger(__name__)
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS, thread_name_prefix='recipe-images'
+)
+
+
+def rendition_paths(image_name):
+    """Пути производных изображений. Они зависят только от имени
+    исходного файла, которое совпадает с хэшем его содержимого."""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return {
+        name: f'{RENDITIONS_DIR}/{stem}_{name}.{options["extension"]}'
+        for name, options in settings.IMAGE_RENDITIONS.items()
+    }
+
+
+def needs_renditions(recipe):
+    return bool(recipe.image) and (
+        recipe.image_renditions != rendition_paths(recipe.image.name)
+    )
+
+
+def render(image, options):
+    image = image.copy()
+    image.thumbnail(options['size'])
+    if image.mode not in MODES[options['format']]:
+        image = image.convert(MODES[options['format']][0])
+    buffer = io.BytesIO()
+    image.save(buffer, options['format'], quality=options['quality'])
+    return buffer.getvalue()
+
+
+def build_renditions(recipe_id):
+    """Создает недостающие производные изображения рецепта
+    и сохраняет их пути, если картинка рецепта не сменилась.
+    Версия рецепта не меняется: ETag, полученный клиентом
+    при создании или изменении рецепта, остается действительным."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+    storage = recipe.image.storage
+    paths = rendition_paths(recipe.image.name)
+    missing = {
+        name: path for name, path in paths.items()
+        if not storage.exists(path)
+    }
+    if missing:
+        with recipe.image.open('rb') as file, Image.open(file) as image:
+            image.load()
+            for name, path in missing.items():
+                storage.save(path, ContentFile(
+                    render(image, settings.IMAGE_RENDITIONS[name])
+                ))
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(
+        image_renditions=paths
+    )
+
+
+def run_in_worker(recipe_id):
+    try:
+        build_renditions(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось создать изображения рецепта %s', recipe_id
+        )
+    finally:
+        connections.close_all()
+
+
+def schedule_renditions(recipe_id):
+    """Ставит создание производных изображений в очередь пула
+    фоновых потоков, чтобы не занимать обработчик запроса."""
+    return executor.submit(run_in_worker, recipe_id)
@@ -0,0 +1,127 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from .cache import INGREDIENTS_VERSION_KEY, get_version
+from .models import Ingredient
+
+NGRAM_SIZE = 3
+
+
+def normalize(name):
+    """Приводит название к виду, в котором его сравнивает istartswith:
+    Django сравнивает UPPER(name) с UPPER(value)."""
+    return name.upper()
+
+
+def ngrams(value, size):
+    return {value[i:i + size] for i in range(len(value) - size + 1)}
+
+
+class IngredientIndexData:
+    def __init__(self, version, items):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.items = items
+        self.keys = [normalize(ingredient.name) for ingredient in items]
+        # n-грамма длиной до NGRAM_SIZE -> позиции названий, в которых
+        # она встречается, по возрастанию.
+        self.postings = defaultdict(list)
+        sizes = range(1, NGRAM_SIZE + 1)
+        for position, key in enumerate(self.keys):
+            for gram in {
+                key[i:i + size]
+                for size in sizes for i in range(len(key) - size + 1)
+            }:
+                self.postings[gram].append(position)
+
+    def candidates(self, term):
+        """Позиции названий, которые могут содержать term: самый
+        короткий список позиций среди n-грамм term."""
+        size = min(len(term), NGRAM_SIZE)
+        return min(
+            (self.postings.get(gram, ()) for gram in ngrams(term, size)),
+            key=len
+        )
+
+
+class IngredientIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Строится лениво при первом обращении и перестраивается, когда
+    меняется версия справочника ингредиентов в кэше или индекс старше
+    INGREDIENT_INDEX_MAX_AGE секунд. Версия в кэше сообщает об изменениях
+    сразу только процессам с общим кэшем; при локальном кэше по умолчанию
+    изменения из других процессов (например, load_ingredients) видны
+    после перестроения по возрасту.
+
+    Поиск по префиксу выполняется бинарным поиском за O(log n + k).
+    Поиск подстроки перебирает только названия из самого короткого
+    списка позиций n-грамм искомой строки (до NGRAM_SIZE символов)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        self._data = None
+
+    def is_stale(self, data, version):
+        return data is None or data.version != version or (
+            time.monotonic() - data.loaded_at
+            > settings.INGREDIENT_INDEX_MAX_AGE
+        )
+
+    def _build(self, version):
+        items = sorted(
+            Ingredient.objects.all(),
+            key=lambda ingredient: (normalize(ingredient.name), ingredient.id)
+        )
+        return IngredientIndexData(version, items)
+
+    def _load(self):
+        version = get_version(INGREDIENTS_VERSION_KEY)
+        data = self._data
+        if self.is_stale(data, version):
+            with self._lock:
+                data = self._data
+                if self.is_stale(data, version):
+                    data = self._data = self._build(version)
+        return data
+
+    def startswith(self, prefix, limit=None):
+        return self._startswith(self._load(), prefix, limit)
+
+    def _startswith(self, data, prefix, limit):
+        keys = data.keys
+        prefix = normalize(prefix)
+        result = []
+        for position in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if not keys[position].startswith(prefix):
+                break
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(data.items[position])
+        return result
+
+    def search(self, term, limit=None):
+        """Ранжированный поиск: сначала совпадения по префиксу,
+        затем по вхождению подстроки, внутри групп - по названию."""
+        data = self._load()
+        result = self._startswith(data, term, limit)
+        term = normalize(term)
+        if not term:
+            return result
+        for position in data.candidates(term):
+            if limit is not None and len(result) >= limit:
+                break
+            key = data.keys[position]
+            if term in key and not key.startswith(term):
+                result.append(data.items[position])
+        return result
+
+
+ingredient_index = IngredientIndex()
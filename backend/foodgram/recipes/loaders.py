@@ -0,0 +1,53 @@
+import csv
+import json
+import re
+from itertools import islice
+
+READ_CHUNK_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,\[]*')
+
+
+def read_csv(file, fieldnames):
+    """Построчно читает CSV, сопоставляя колонки с fieldnames.
+    Строка заголовка, совпадающая с fieldnames, пропускается."""
+    for row in csv.reader(file):
+        if not row:
+            continue
+        if tuple(row) == tuple(fieldnames):
+            continue
+        yield dict(zip(fieldnames, row))
+
+
+def read_json(file, chunk_size=READ_CHUNK_SIZE):
+    """Потоково читает объекты из JSON-массива или JSON Lines,
+    не загружая файл в память целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    for chunk in iter(lambda: file.read(chunk_size), ''):
+        buffer += chunk
+        position = 0
+        while True:
+            position = SEPARATORS.match(buffer, position).end()
+            if position == len(buffer) or buffer[position] == ']':
+                break
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break
+            yield obj
+        buffer = buffer[position:]
+    if buffer.strip(' \t\r\n]'):
+        raise ValueError('Некорректный JSON в конце файла')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': lambda file, fieldnames: read_json(file),
+    'jsonl': lambda file, fieldnames: read_json(file),
+}
+
+
+def chunked(iterable, size):
+    """Разбивает итератор на списки длиной не больше size."""
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
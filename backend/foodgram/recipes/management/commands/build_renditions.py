@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_renditions, needs_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает недостающие уменьшенные копии картинок рецептов, '
+        'например после массовой загрузки данных.'
+    )
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'image_renditions'
+        ).iterator()
+        for recipe in recipes:
+            if not needs_renditions(recipe):
+                continue
+            try:
+                build_renditions(recipe.id)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+            else:
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {built}, с ошибками: {failed}.'
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import build
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит индекс похожести рецептов по ингредиентам и сохраняет '
+        'его в SIMILARITY_INDEX_PATH, чтобы процессы приложения '
+        'загружали его с диска, а не строили из БД при старте.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        index = build()
+        index.save(settings.SIMILARITY_INDEX_PATH)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {index.size} за '
+            f'{time.monotonic() - started:.1f} с.'
+        ))
@@ -0,0 +1,162 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes import counters, feed, search, similarity
+from recipes.cache import bump_recipes_version, bump_tags_version
+from recipes.colors import to_hex
+from recipes.loaders import chunked
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует синтетические данные для нагрузочного тестирования. '
+        'Ингредиенты берутся из БД, поэтому сначала выполните '
+        'load_ingredients.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument(
+            '--favourites', type=int, default=20,
+            help='Количество избранных рецептов на пользователя.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=5,
+            help='Количество рецептов в корзине на пользователя.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Количество подписок на пользователя.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='За сколько последних дней распределить добавления '
+                 'в избранное и корзины.',
+        )
+        parser.add_argument('--password', default='benchmark-password')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.options = options
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if len(ingredient_ids) < options['ingredients_per_recipe']:
+            raise CommandError(
+                'Недостаточно ингредиентов в БД, выполните load_ingredients.'
+            )
+        started = time.monotonic()
+        self.now = timezone.now()
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users()
+            recipe_ids = self.create_recipes(user_ids)
+            self.bulk_create(RecipeIngredient, (
+                RecipeIngredient(recipe_id=recipe_id, ingredient_id=pk,
+                                 amount=self.random.randint(1, 500))
+                for recipe_id in recipe_ids
+                for pk in self.sample(
+                    ingredient_ids, options['ingredients_per_recipe'])
+            ))
+            self.bulk_create(RecipeTag, (
+                RecipeTag(recipe_id=recipe_id, tag_id=pk)
+                for recipe_id in recipe_ids
+                for pk in self.sample(tag_ids, options['tags_per_recipe'])
+            ))
+            for model, size in ((Favourite, options['favourites']),
+                                (ShoppingCart, options['carts'])):
+                self.bulk_create(model, (
+                    model(user_id=user_id, recipe_id=recipe_id,
+                          created=self.random_moment())
+                    for user_id in user_ids
+                    for recipe_id in self.sample(recipe_ids, size)
+                ))
+            self.bulk_create(Subscription, (
+                Subscription(user_id=user_id, author_id=author_id)
+                for user_id in user_ids
+                for author_id in self.sample(
+                    user_ids, options['subscriptions'])
+                if author_id != user_id
+            ))
+            feed.rebuild()
+            counters.reconcile()
+            search.update_documents(recipe_ids)
+            transaction.on_commit(bump_recipes_version)
+            transaction.on_commit(similarity.reset)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные сгенерированы за {time.monotonic() - started:.1f} с.'
+        ))
+
+    def random_moment(self):
+        return self.now - timedelta(
+            seconds=self.random.uniform(0, self.options['days'] * 86400)
+        )
+
+    def sample(self, population, size):
+        return self.random.sample(population, min(size, len(population)))
+
+    def bulk_create(self, model, objects):
+        created = 0
+        for batch in chunked(objects, BATCH_SIZE):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {created}')
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [Tag(name=name, color=to_hex(color), slug=slug)
+             for name, color, slug in TAGS],
+            ignore_conflicts=True,
+        )
+        transaction.on_commit(bump_tags_version)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self):
+        last_id = User.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        password = make_password(self.options['password'])
+        prefix = f'user_{self.options["seed"]}_{last_id}'
+        self.bulk_create(User, (
+            User(username=f'{prefix}_{number}',
+                 email=f'{prefix}_{number}@example.com',
+                 first_name=f'Имя {number}',
+                 last_name=f'Фамилия {number}',
+                 password=password)
+            for number in range(self.options['users'])
+        ))
+        return list(User.objects.filter(id__gt=last_id).values_list(
+            'id', flat=True))
+
+    def create_recipes(self, user_ids):
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        self.bulk_create(Recipe, (
+            Recipe(author_id=self.random.choice(user_ids),
+                   name=f'Рецепт {number}',
+                   text=f'Описание рецепта {number}',
+                   cooking_time=self.random.randint(1, 180),
+                   image='recipes/temp.png')
+            for number in range(self.options['recipes'])
+        ))
+        return list(Recipe.objects.filter(id__gt=last_id).values_list(
+            'id', flat=True))
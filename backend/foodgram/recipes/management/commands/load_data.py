@@ -0,0 +1,216 @@
+import os
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from recipes import counters, feed, search, similarity
+from recipes.cache import (bump_cart_versions, bump_recipes_version,
+                           bump_tags_version)
+from recipes.colors import to_hex
+from recipes.loaders import READERS, chunked
+from recipes.models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+ENTITIES = (
+    ('tags', ('name', 'color', 'slug'), ()),
+    ('users',
+     ('username', 'email', 'first_name', 'last_name', 'password'), ()),
+    ('recipes',
+     ('id', 'author', 'name', 'text', 'cooking_time', 'image'), ('users',)),
+    ('recipe_ingredients',
+     ('recipe', 'ingredient', 'measurement_unit', 'amount'),
+     ('recipes', 'ingredients')),
+    ('recipe_tags', ('recipe', 'tag'), ('recipes', 'tags')),
+    ('favourites', ('user', 'recipe'), ('users', 'recipes')),
+    ('shopping_cart', ('user', 'recipe'), ('users', 'recipes')),
+    ('subscriptions', ('user', 'author'), ('users',)),
+)
+
+LOOKUPS = {
+    'users': lambda: dict(User.objects.values_list('username', 'id')),
+    'recipes': lambda: set(Recipe.objects.values_list('id', flat=True)),
+    'ingredients': lambda: {
+        (name, unit): pk for pk, name, unit in
+        Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+    },
+    'tags': lambda: dict(Tag.objects.values_list('slug', 'id')),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает тэги, пользователей, рецепты, избранное, корзины '
+        'и подписки из файлов <сущность>.jsonl или <сущность>.csv '
+        'в указанной директории.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Директория с файлами.')
+        parser.add_argument(
+            '--format',
+            choices=('jsonl', 'csv'),
+            default='jsonl',
+            help='Формат файлов.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк в одной транзакции.',
+        )
+        parser.add_argument(
+            '--default-password',
+            help='Пароль для пользователей без хэша пароля в файле.',
+        )
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['directory']):
+            raise CommandError(
+                f'Директория не найдена: {options["directory"]}'
+            )
+        self.options = options
+        self.default_password = make_password(options['default_password'])
+        for name, fieldnames, lookups in ENTITIES:
+            path = os.path.join(
+                options['directory'], f'{name}.{options["format"]}'
+            )
+            if os.path.isfile(path):
+                for lookup in lookups:
+                    setattr(self, lookup, LOOKUPS[lookup]())
+                self.load(name, path, fieldnames)
+
+    def load(self, name, path, fieldnames):
+        """Потоково читает файл и сохраняет объекты пачками,
+        каждая пачка - в отдельной транзакции. Внешние ключи
+        разрешаются через словари LOOKUPS, а не запросом на строку."""
+        build = getattr(self, f'build_{name}')
+        model = None
+        rows = skipped = 0
+        started = time.monotonic()
+        with open(path, encoding='utf-8', newline='') as file:
+            reader = READERS[self.options['format']](file, fieldnames)
+            for batch in chunked(reader, self.options['batch_size']):
+                objects = [obj for obj in map(build, batch) if obj]
+                rows += len(batch)
+                skipped += len(batch) - len(objects)
+                if not objects:
+                    continue
+                model = type(objects[0])
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        objects,
+                        batch_size=self.options['batch_size'],
+                        ignore_conflicts=True,
+                    )
+                    self.after_batch(model, objects)
+        if model is Recipe:
+            self.reset_sequence(Recipe)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{name}: прочитано строк {rows}, пропущено {skipped}, '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с.'
+        ))
+
+    def after_batch(self, model, objects):
+        """Делает то, что при обычном сохранении делают сигналы."""
+        if model is Subscription:
+            feed.backfill(
+                (obj.user_id, obj.author_id) for obj in objects
+            )
+        if model is Tag:
+            transaction.on_commit(bump_tags_version)
+        if model in (Recipe, Favourite, ShoppingCart, RecipeTag):
+            transaction.on_commit(bump_recipes_version)
+        if model in (Recipe, RecipeIngredient):
+            transaction.on_commit(similarity.reset)
+            search.update_documents(
+                obj.id if model is Recipe else obj.recipe_id
+                for obj in objects
+            )
+        if model in counters.COUNTERS:
+            counters.reconcile({obj.recipe_id for obj in objects})
+        if model is ShoppingCart:
+            transaction.on_commit(lambda: bump_cart_versions(
+                {obj.user_id for obj in objects}
+            ))
+
+    def reset_sequence(self, model):
+        """После вставки рецептов с явными id выравнивает
+        последовательность первичного ключа."""
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def build_tags(self, row):
+        try:
+            color = to_hex(row['color'])
+        except ValueError:
+            return None
+        return Tag(name=row['name'], color=color, slug=row['slug'])
+
+    def build_users(self, row):
+        return User(
+            username=row['username'],
+            email=row['email'],
+            first_name=row.get('first_name', ''),
+            last_name=row.get('last_name', ''),
+            password=row.get('password') or self.default_password,
+        )
+
+    def build_recipes(self, row):
+        author_id = self.users.get(row['author'])
+        if author_id is None:
+            return None
+        return Recipe(
+            id=int(row['id']),
+            author_id=author_id,
+            name=row['name'],
+            text=row['text'],
+            cooking_time=int(row['cooking_time']),
+            image=row.get('image') or '',
+        )
+
+    def build_recipe_ingredients(self, row):
+        recipe_id = int(row['recipe'])
+        ingredient_id = self.ingredients.get(
+            (row['ingredient'], row['measurement_unit'])
+        )
+        if recipe_id not in self.recipes or ingredient_id is None:
+            return None
+        return RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=int(row['amount']),
+        )
+
+    def build_recipe_tags(self, row):
+        recipe_id = int(row['recipe'])
+        tag_id = self.tags.get(row['tag'])
+        if recipe_id not in self.recipes or tag_id is None:
+            return None
+        return RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+
+    def build_user_recipe(self, model, row):
+        user_id = self.users.get(row['user'])
+        recipe_id = int(row['recipe'])
+        if user_id is None or recipe_id not in self.recipes:
+            return None
+        return model(user_id=user_id, recipe_id=recipe_id)
+
+    def build_favourites(self, row):
+        return self.build_user_recipe(Favourite, row)
+
+    def build_shopping_cart(self, row):
+        return self.build_user_recipe(ShoppingCart, row)
+
+    def build_subscriptions(self, row):
+        user_id = self.users.get(row['user'])
+        author_id = self.users.get(row['author'])
+        if user_id is None or author_id is None or user_id == author_id:
+            return None
+        return Subscription(user_id=user_id, author_id=author_id)
@@ -1,29 +1,69 @@
-import csv
-from sys import stdout
+import os
+import time
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from recipes.cache import bump_ingredients_version
+from recipes.loaders import READERS, chunked
 from recipes.models import Ingredient
 
+FIELDNAMES = ('name', 'measurement_unit')
+
 
 class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу с ингредиентами.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=tuple(READERS),
+            help='Формат файла. По умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество строк в одном INSERT.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл не найден: {path}')
 
-    def handle(self, *args, **kwargs):
-        load_ingredients()
-
-
-def load_ingredients():
-    print("Начинаем импорт ингредиентов.")
-    with open('data/ingredients.csv', newline='') as csvfile:
-        try:
-            csvreader = csv.reader(csvfile, delimiter=',', quotechar='"')
-            next(csvreader)
-            for row in csvreader:
-                obj = Ingredient(
-                    name=row[0],
-                    measurement_unit=row[1]
-                )
-                obj.save()
-            print("Импорт ингедиентов успешно завершен!")
-        except CommandError:
-            stdout('Файл не найден!')
+        self.stdout.write('Начинаем импорт ингредиентов.')
+        started = time.monotonic()
+        rows = 0
+        before = Ingredient.objects.count()
+        with open(path, encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                reader = READERS[file_format](file, FIELDNAMES)
+                for batch in chunked(reader, options['batch_size']):
+                    Ingredient.objects.bulk_create(
+                        [Ingredient(name=row['name'],
+                                    measurement_unit=row['measurement_unit'])
+                         for row in batch],
+                        batch_size=options['batch_size'],
+                        ignore_conflicts=True,
+                    )
+                    rows += len(batch)
+                transaction.on_commit(bump_ingredients_version)
+        created = Ingredient.objects.count() - before
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт ингредиентов успешно завершен! '
+            f'Прочитано строк: {rows}, добавлено: {created}, '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с.'
+        ))
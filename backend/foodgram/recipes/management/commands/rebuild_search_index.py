@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.search import create_index, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает поисковые документы всех рецептов. Заодно '
+        'создает недостающие объекты поискового индекса СУБД, '
+        'например триггеры FTS5 после пересоздания таблицы в SQLite.'
+    )
+
+    def handle(self, *args, **options):
+        with connection.schema_editor() as schema_editor:
+            create_index(schema_editor)
+        with transaction.atomic():
+            count = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {count}.'
+        ))
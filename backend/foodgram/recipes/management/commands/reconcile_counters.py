@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики избранного и корзин у рецептов, '
+        'если они разошлись с данными. Рассчитана на периодический '
+        'запуск, например из cron.'
+    )
+
+    def handle(self, *args, **options):
+        fixed = reconcile()
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено рецептов: {fixed}.'
+        ))
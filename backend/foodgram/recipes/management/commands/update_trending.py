@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import process_events
+
+
+class Command(BaseCommand):
+    help = (
+        'Учитывает новые добавления в избранное и корзины в популярности '
+        'рецептов. Рассчитана на периодический запуск, например из cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_events(options['batch_size'])
+            total += processed
+            if processed < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено событий: {total}.'
+        ))
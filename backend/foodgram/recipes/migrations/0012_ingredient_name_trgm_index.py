@@ -0,0 +1,33 @@
+from django.db import migrations
+
+CREATE_INDEX = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+)
+DROP_INDEX = ('DROP INDEX IF EXISTS recipes_ingredient_name_trgm',)
+
+
+def run_postgresql(statements):
+    """Триграммный индекс нужен только PostgreSQL: он ускоряет
+    istartswith и icontains, которые Django строит как
+    UPPER(name) LIKE UPPER(...)."""
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_alter_ingredient_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_postgresql(CREATE_INDEX), run_postgresql(DROP_INDEX)
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Перед добавлением ограничения уникальности объединяет
+    дубликаты ингредиентов, переназначая рецепты на первый из них."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep_id'])
+        for item in RecipeIngredient.objects.filter(ingredient__in=extra):
+            kept, created = RecipeIngredient.objects.get_or_create(
+                recipe_id=item.recipe_id,
+                ingredient_id=group['keep_id'],
+                defaults={'amount': item.amount},
+            )
+            if not created:
+                kept.amount += item.amount
+                kept.save()
+            item.delete()
+        extra.delete()
+    if schema_editor.connection.vendor == 'postgresql':
+        # Внешние ключи PostgreSQL проверяются отложенно, в конце
+        # транзакции. Пока проверки удаленных строк не выполнены,
+        # ALTER TABLE из AddConstraint падает с "pending trigger events".
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_ingredient_name_trgm_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+import logging
+import re
+
+import webcolors
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+# Копия recipes.colors.to_hex на момент миграции: миграция
+# не должна зависеть от того, как этот модуль изменится позже.
+NAME_TO_HEX = dict(webcolors.CSS3_NAMES_TO_HEX)
+HEX_RE = re.compile(r'^#([a-f0-9]{3}|[a-f0-9]{6})$')
+
+
+def to_hex(value):
+    """Приводит цвет в виде #rgb, #rrggbb или названия CSS3
+    к виду #rrggbb. Для неизвестного цвета - ValueError."""
+    value = value.strip().lower()
+    if value in NAME_TO_HEX:
+        return NAME_TO_HEX[value]
+    match = HEX_RE.match(value)
+    if match is None:
+        raise ValueError(f'{value!r} is not a valid hex color')
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = ''.join(digit * 2 for digit in digits)
+    return f'#{digits}'
+
+
+def nearest_free(color, used):
+    """Ближайший к color цвет, которого нет в used: каналы
+    сдвигаются на 1, 2, ... пока не найдется свободный."""
+    channels = [int(color[i:i + 2], 16) for i in (1, 3, 5)]
+    for step in range(1, 256):
+        for index in (2, 1, 0):
+            for delta in (step, -step):
+                candidate = list(channels)
+                candidate[index] = min(max(candidate[index] + delta, 0), 255)
+                value = '#{:02x}{:02x}{:02x}'.format(*candidate)
+                if value not in used:
+                    return value
+    raise ValueError(f'No free color near {color}')
+
+
+def colors_to_hex(apps, schema_editor):
+    """Приводит сохраненные цвета тэгов (названия или hex
+    в любом регистре) к виду #rrggbb. Если цвет уже занят другим
+    тэгом, берется ближайший свободный. Цвета, которые не удалось
+    распознать, остаются как есть и попадают в лог с уровнем WARNING:
+    их нужно исправить в админке."""
+    Tag = apps.get_model('recipes', 'Tag')
+    tags = list(Tag.objects.order_by('id'))
+    used = {tag.color for tag in tags}
+    unknown = []
+    for tag in tags:
+        try:
+            color = to_hex(tag.color)
+        except ValueError:
+            unknown.append(tag)
+            continue
+        if color == tag.color:
+            continue
+        used.discard(tag.color)
+        if color in used:
+            free = nearest_free(color, used)
+            logger.warning(
+                'Tag %s (%s): %r -> %s (%s is taken by another tag)',
+                tag.id, tag.name, tag.color, free, color
+            )
+            color = free
+        used.add(color)
+        tag.color = color
+        tag.save(update_fields=['color'])
+    for tag in unknown:
+        logger.warning(
+            'Tag %s (%s): unknown color %r left unchanged, '
+            'fix it in the admin', tag.id, tag.name, tag.color
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(colors_to_hex, migrations.RunPython.noop),
+    ]
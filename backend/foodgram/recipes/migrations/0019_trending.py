@@ -0,0 +1,45 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:43
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=32, unique=True, verbose_name='Источник событий')),
+                ('last_id', models.BigIntegerField(default=0, verbose_name='id последнего учтенного события')),
+            ],
+            options={
+                'verbose_name': 'Отметка обработки событий',
+                'verbose_name_plural': 'Отметки обработки событий',
+            },
+        ),
+        migrations.AddField(
+            model_name='favourite',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Добавлено'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(editable=False, help_text='Натуральный логарифм суммы весов событий с экспоненциальным затуханием.', null=True, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Добавлено'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score'], name='recipe_trending_score_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:50
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+DOCUMENT_TABLE = 'recipes_recipesearchdocument'
+FTS_TABLE = 'recipes_recipesearch_fts'
+
+# Копия DDL из recipes.search на момент миграции.
+CREATE_INDEX = {
+    'postgresql': (
+        f'ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS vector '
+        "tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('russian'::regconfig, name), 'A') || "
+        "setweight(to_tsvector('russian'::regconfig, ingredients), 'B') || "
+        "setweight(to_tsvector('russian'::regconfig, text), 'C')) STORED",
+        f'CREATE INDEX IF NOT EXISTS recipes_search_vector_idx '
+        f'ON {DOCUMENT_TABLE} USING gin (vector)',
+    ),
+    'sqlite': (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        f"name, ingredients, text, content='{DOCUMENT_TABLE}', "
+        f"content_rowid='recipe_id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+        f'VALUES (new.recipe_id, new.name, new.ingredients, new.text); '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, ingredients, '
+        f"text) VALUES ('delete', old.recipe_id, old.name, "
+        f'old.ingredients, old.text); '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, ingredients, '
+        f"text) VALUES ('delete', old.recipe_id, old.name, "
+        f'old.ingredients, old.text); '
+        f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+        f'VALUES (new.recipe_id, new.name, new.ingredients, new.text); '
+        f'END',
+    ),
+}
+DROP_INDEX = {
+    'postgresql': (
+        f'ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS vector',
+    ),
+    'sqlite': (
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    ),
+}
+
+
+def run_statements(statements):
+    def operation(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for statement in statements.get(vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+def normalize(value):
+    return value.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def fill_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSearchDocument = apps.get_model('recipes', 'RecipeSearchDocument')
+    ingredients = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.order_by(
+            'recipe_id', 'ingredient__name').values_list(
+            'recipe_id', 'ingredient__name').iterator():
+        ingredients[recipe_id].append(name)
+    RecipeSearchDocument.objects.bulk_create(
+        (
+            RecipeSearchDocument(
+                recipe_id=recipe_id, name=normalize(name),
+                text=normalize(text),
+                ingredients=normalize(', '.join(ingredients[recipe_id])),
+            )
+            for recipe_id, name, text in Recipe.objects.order_by(
+                'id').values_list('id', 'name', 'text').iterator()
+        ),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_trending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('name', models.TextField(verbose_name='Название')),
+                ('ingredients', models.TextField(verbose_name='Ингредиенты')),
+                ('text', models.TextField(verbose_name='Описание')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+            },
+        ),
+        migrations.RunPython(
+            run_statements(CREATE_INDEX), run_statements(DROP_INDEX)
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,13 @@
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from users.models import User
+from users.models import Subscription, User
+from .colors import to_hex
 
 
 class Tag(models.Model):
@@ -26,6 +32,12 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        try:
+            self.color = to_hex(self.color)
+        except ValueError:
+            raise ValidationError({'color': 'Неизвестный цвет'})
+
 
 class Ingredient(models.Model):
     name = models.CharField(
@@ -40,11 +52,76 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_measurement_unit'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами избранного, корзины и подписки
+        на автора для пользователя, чтобы не делать запрос на каждую
+        строку при сериализации."""
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                is_author_subscribed=false,
+            )
+        return self.annotate(
+            is_favorited=Exists(Favourite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_author_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
+    def with_relations(self):
+        """Подгружает автора, id тэгов и ингредиенты рецептов
+        фиксированным числом запросов. Сами тэги берутся из tag_registry."""
+        return self.select_related('author').prefetch_related(
+            Prefetch(
+                'recipetag',
+                queryset=RecipeTag.objects.only(
+                    'recipe_id', 'tag_id'
+                ).order_by('tag_id')
+            ),
+            Prefetch(
+                'recipeingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def latest_by_authors(self, author_ids, limit=None):
+        """Возвращает не больше limit последних рецептов каждого автора
+        одним запросом с оконной функцией ROW_NUMBER()."""
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return list(queryset)
+        queryset = queryset.annotate(
+            preview_rank=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=F('id').desc(),
+            )
+        ).order_by()
+        sql, params = queryset.query.sql_with_params()
+        return list(self.model.objects.raw(
+            f'SELECT * FROM ({sql}) AS preview '
+            f'WHERE preview_rank <= %s ORDER BY id DESC',
+            (*params, limit)
+        ))
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -79,10 +156,50 @@ class Recipe(models.Model):
         ]
     )
 
+    favourites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность',
+        help_text='Натуральный логарифм суммы весов событий '
+                  'с экспоненциальным затуханием.',
+        null=True,
+        editable=False,
+    )
+    image_renditions = models.JSONField(
+        verbose_name='Производные изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Версия',
+        default=1,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['-favourites_count', '-id'],
+                name='recipe_favourites_count_idx'
+            ),
+            models.Index(
+                fields=['-trending_score'], name='recipe_trending_score_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -156,6 +273,11 @@ class Favourite(models.Model):
         related_name='favourites',
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлено',
+        default=timezone.now,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-id']
@@ -185,6 +307,11 @@ class ShoppingCart(models.Model):
         related_name='shoppingcart',
         verbose_name='Рецепт в корзине у пользователя'
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлено',
+        default=timezone.now,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -199,3 +326,88 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username}'
                 'добавил в корзину рецепт {self.recipe.name}')
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя. Лента заполняется
+    при публикации рецепта и при подписке на автора."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class TrendingWatermark(models.Model):
+    """Последнее учтенное в популярности рецептов событие
+    (добавление в избранное или корзину) по каждому источнику."""
+    source = models.CharField(
+        max_length=32,
+        unique=True,
+        verbose_name='Источник событий',
+    )
+    last_id = models.BigIntegerField(
+        default=0,
+        verbose_name='id последнего учтенного события',
+    )
+
+    class Meta:
+        verbose_name = 'Отметка обработки событий'
+        verbose_name_plural = 'Отметки обработки событий'
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
+
+
+class RecipeSearchDocument(models.Model):
+    """Текст рецепта для полнотекстового поиска. Индекс строится
+    средствами СУБД: в PostgreSQL это вычисляемый столбец tsvector
+    с GIN-индексом, в SQLite — таблица FTS5 (см. recipes/search.py)."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search_document',
+        verbose_name='Рецепт',
+    )
+    name = models.TextField(verbose_name='Название')
+    ingredients = models.TextField(verbose_name='Ингредиенты')
+    text = models.TextField(verbose_name='Описание')
+
+    class Meta:
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,200 @@
+import re
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .cache import bump_recipes_version
+from .loaders import chunked
+from .models import Recipe, RecipeIngredient, RecipeSearchDocument
+
+BATCH_SIZE = 1000
+DOCUMENT_TABLE = RecipeSearchDocument._meta.db_table
+FTS_TABLE = 'recipes_recipesearch_fts'
+WORD_RE = re.compile(r'\w+')
+
+CREATE_INDEX = {
+    'postgresql': (
+        f'ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN IF NOT EXISTS vector '
+        "tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('russian'::regconfig, name), 'A') || "
+        "setweight(to_tsvector('russian'::regconfig, ingredients), 'B') || "
+        "setweight(to_tsvector('russian'::regconfig, text), 'C')) STORED",
+        f'CREATE INDEX IF NOT EXISTS recipes_search_vector_idx '
+        f'ON {DOCUMENT_TABLE} USING gin (vector)',
+    ),
+    'sqlite': (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+        f"name, ingredients, text, content='{DOCUMENT_TABLE}', "
+        f"content_rowid='recipe_id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+        f'VALUES (new.recipe_id, new.name, new.ingredients, new.text); '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, ingredients, '
+        f"text) VALUES ('delete', old.recipe_id, old.name, "
+        f'old.ingredients, old.text); '
+        f'END',
+        f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE '
+        f'ON {DOCUMENT_TABLE} BEGIN '
+        f'INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, ingredients, '
+        f"text) VALUES ('delete', old.recipe_id, old.name, "
+        f'old.ingredients, old.text); '
+        f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+        f'VALUES (new.recipe_id, new.name, new.ingredients, new.text); '
+        f'END',
+    ),
+}
+DROP_INDEX = {
+    'postgresql': (
+        f'ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN IF EXISTS vector',
+    ),
+    'sqlite': (
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+        f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    ),
+}
+
+# Вес совпадений в названии, ингредиентах и описании для bm25() FTS5.
+FTS_WEIGHTS = (10.0, 5.0, 1.0)
+# Поисковая таблица присоединяется к рецептам одним JOIN: ранг
+# считается по той же строке индекса, что и совпадение.
+MATCH = {
+    'postgresql': (
+        DOCUMENT_TABLE,
+        f'{DOCUMENT_TABLE}.recipe_id = recipes_recipe.id',
+        f"{DOCUMENT_TABLE}.vector @@ websearch_to_tsquery('russian', %s)",
+    ),
+    'sqlite': (
+        FTS_TABLE,
+        f'{FTS_TABLE}.rowid = recipes_recipe.id',
+        f'{FTS_TABLE} MATCH %s',
+    ),
+}
+RANK = {
+    'postgresql': (
+        f'ts_rank_cd({DOCUMENT_TABLE}.vector, '
+        f"websearch_to_tsquery('russian', %s))"
+    ),
+    'sqlite': f'-bm25({FTS_TABLE}, {", ".join(map(str, FTS_WEIGHTS))})',
+}
+
+
+def execute(statements, schema_editor):
+    for statement in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def create_index(schema_editor):
+    """Создает поисковый индекс СУБД. Повторный вызов безопасен:
+    так можно восстановить триггеры SQLite, если миграция
+    пересоздала таблицу документов."""
+    execute(CREATE_INDEX, schema_editor)
+
+
+def drop_index(schema_editor):
+    execute(DROP_INDEX, schema_editor)
+
+
+def normalize(value):
+    """Ни FTS5, ни русский словарь PostgreSQL не отождествляют
+    ё и е, поэтому ё заменяется и в документах, и в запросах."""
+    return value.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def build_documents(recipe_ids):
+    """Документы рецептов двумя запросами: рецепты и названия
+    их ингредиентов."""
+    ingredients = defaultdict(list)
+    for recipe_id, name in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+    ).order_by('recipe_id', 'ingredient__name').values_list(
+            'recipe_id', 'ingredient__name'):
+        ingredients[recipe_id].append(name)
+    return [
+        RecipeSearchDocument(
+            recipe_id=recipe_id, name=normalize(name), text=normalize(text),
+            ingredients=normalize(', '.join(ingredients[recipe_id])),
+        )
+        for recipe_id, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).order_by().values_list('id', 'name', 'text')
+    ]
+
+
+def update_documents(recipe_ids):
+    """Пересобирает документы рецептов. Документы удаленных
+    рецептов удаляются каскадно вместе с рецептом. Сбрасывает
+    закэшированные размеры списков: от документов зависит ?search=."""
+    for batch in chunked(set(recipe_ids), BATCH_SIZE):
+        with transaction.atomic():
+            RecipeSearchDocument.objects.filter(
+                recipe_id__in=batch
+            ).delete()
+            RecipeSearchDocument.objects.bulk_create(
+                build_documents(batch)
+            )
+    transaction.on_commit(bump_recipes_version)
+
+
+def update_ingredient_documents(ingredient_id):
+    """Пересобирает документы рецептов с переименованным
+    ингредиентом."""
+    update_documents(RecipeIngredient.objects.filter(
+        ingredient_id=ingredient_id
+    ).values_list('recipe_id', flat=True))
+
+
+def rebuild():
+    """Пересобирает документы всех рецептов. Возвращает их число."""
+    RecipeSearchDocument.objects.all().delete()
+    recipe_ids = Recipe.objects.order_by('id').values_list('id', flat=True)
+    count = 0
+    for batch in chunked(recipe_ids.iterator(), BATCH_SIZE):
+        RecipeSearchDocument.objects.bulk_create(build_documents(batch))
+        count += len(batch)
+    transaction.on_commit(bump_recipes_version)
+    return count
+
+
+def fts_query(value):
+    """Запрос FTS5 из слов value: все слова обязательны, каждое
+    ищется как префикс, что отчасти заменяет стемминг.
+    Кавычки защищают от синтаксиса FTS5 в пользовательском вводе."""
+    return ' '.join(
+        f'"{word}"*' for word in WORD_RE.findall(value.lower())
+    )
+
+
+def search(queryset, value):
+    """Рецепты, подходящие под запрос value, по убыванию
+    релевантности в поле search_rank. Для СУБД без полнотекстового
+    индекса ищет подстроку в документе без ранжирования."""
+    vendor = connection.vendor
+    value = normalize(value)
+    if vendor not in MATCH:
+        return queryset.filter(
+            Q(search_document__name__icontains=value)
+            | Q(search_document__ingredients__icontains=value)
+            | Q(search_document__text__icontains=value)
+        )
+    if vendor == 'sqlite':
+        value = fts_query(value)
+    if not value.strip():
+        return queryset.none()
+    table, join, match = MATCH[vendor]
+    return queryset.extra(
+        tables=[table], where=[join, match], params=[value]
+    ).annotate(
+        search_rank=RawSQL(
+            RANK[vendor], [value] if vendor == 'postgresql' else [],
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-id')
@@ -0,0 +1,104 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Subscription
+from . import counters, feed, images, search, similarity
+from .cache import (bump_cart_versions, bump_ingredients_version,
+                    bump_recipe_carts, bump_recipes_version, bump_tags_version)
+from .ingredient_index import ingredient_index
+from .models import (Favourite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeTag, ShoppingCart, Tag)
+from .tag_registry import tag_registry
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def shopping_cart_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_cart_versions, [instance.user_id]))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(partial(bump_recipe_carts, instance.recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    transaction.on_commit(bump_ingredients_version)
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            partial(search.update_ingredient_documents, instance.id)
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=Favourite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def recipes_changed(sender, **kwargs):
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    transaction.on_commit(bump_tags_version)
+    transaction.on_commit(tag_registry.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill([(instance.user_id, instance.author_id)])
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(sender, instance, **kwargs):
+    feed.trim(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    if images.needs_renditions(instance):
+        transaction.on_commit(
+            partial(images.schedule_renditions, instance.id)
+        )
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+def counter_item_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_counter(sender, instance.recipe_id, 1)
+
+
+@receiver(post_delete, sender=Favourite)
+@receiver(post_delete, sender=ShoppingCart)
+def counter_item_deleted(sender, instance, **kwargs):
+    counters.change_counter(sender, instance.recipe_id, -1)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_composition_changed(sender, instance, **kwargs):
+    recipe_id = instance.id if sender is Recipe else instance.recipe_id
+    transaction.on_commit(partial(similarity.log_change, recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def search_document_changed(sender, instance, **kwargs):
+    recipe_id = instance.id if sender is Recipe else instance.recipe_id
+    transaction.on_commit(partial(search.update_documents, [recipe_id]))
@@ -0,0 +1,397 @@
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Sum
+
+from .cache import get_version
+from .models import RecipeIngredient
+
+GENERATION_KEY = 'similarity:generation'
+LOG_KEY = 'similarity:log'
+CHANGE_KEY = 'similarity:change:{position}'
+PRIME = (1 << 31) - 1
+EMPTY = PRIME
+CHUNK_SIZE = 50000
+MAX_REPLAY = 10000
+
+
+def hash_params(num_perm):
+    """Коэффициенты хэш-функций MinHash вида (a * x + b) mod PRIME.
+    Зерно фиксировано, чтобы сохраненные сигнатуры оставались
+    совместимыми между процессами."""
+    rng = np.random.RandomState(20230601)
+    return (
+        rng.randint(1, PRIME, size=num_perm).astype(np.int64),
+        rng.randint(0, PRIME, size=num_perm).astype(np.int64),
+    )
+
+
+def load_sets(recipe_ids=None):
+    """Наборы ингредиентов рецептов одним запросом без JOIN."""
+    rows = RecipeIngredient.objects.order_by()
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    sets = defaultdict(set)
+    for recipe_id, ingredient_id in rows.values_list(
+            'recipe_id', 'ingredient_id').iterator():
+        sets[recipe_id].add(ingredient_id)
+    return sets
+
+
+def fingerprint():
+    """Отпечаток таблицы состава рецептов одним агрегатным запросом.
+    Изменение наборов ингредиентов меняет число строк, наибольший id
+    (новые строки получают новые id) или суммы внешних ключей
+    (если строку поправили на месте, например в админке)."""
+    stats = RecipeIngredient.objects.order_by().aggregate(
+        count=Count('id'), last_id=Max('id'),
+        recipes=Sum('recipe_id'), ingredients=Sum('ingredient_id'),
+    )
+    return tuple(
+        stats[name] or 0
+        for name in ('count', 'last_id', 'recipes', 'ingredients')
+    )
+
+
+def log_change(recipe_id):
+    """Записывает в общий журнал изменений в кэше, что состав
+    рецепта изменился. Процессы применяют журнал к своим индексам."""
+    cache.add(LOG_KEY, 0, None)
+    position = cache.incr(LOG_KEY)
+    cache.set(
+        CHANGE_KEY.format(position=position), recipe_id,
+        settings.SIMILARITY_LOG_TIMEOUT
+    )
+
+
+def reset():
+    """Заставляет все процессы заново построить индекс из БД,
+    например после массовой загрузки данных в обход сигналов."""
+    cache.set(GENERATION_KEY, time.time(), None)
+
+
+class SimilarityIndex:
+    """Индекс рецептов по составу ингредиентов в памяти процесса.
+
+    Хранит MinHash-сигнатуры наборов ингредиентов для поиска похожих
+    рецептов и обратный индекс ингредиент -> строки для поиска
+    рецептов, которые можно приготовить из заданных продуктов.
+    Строки, освобожденные удаленными рецептами, остаются пустыми."""
+
+    def __init__(self, num_perm=None):
+        self.num_perm = num_perm or settings.SIMILARITY_NUM_PERM
+        self.a, self.b = hash_params(self.num_perm)
+        self.rows = {}
+        self.recipe_ids = np.zeros(0, dtype=np.int64)
+        self.lengths = np.zeros(0, dtype=np.int32)
+        self.signatures = np.zeros((0, self.num_perm), dtype=np.int64)
+        self.sets = []
+        self.postings = defaultdict(set)
+        self.posting_arrays = {}
+        self.generation = None
+        self.position = 0
+        self.fingerprint = None
+        self.checked_at = time.monotonic()
+
+    @property
+    def size(self):
+        return len(self.sets)
+
+    def signature(self, ingredient_ids):
+        if not ingredient_ids:
+            return np.full(self.num_perm, EMPTY, dtype=np.int64)
+        values = np.fromiter(ingredient_ids, dtype=np.int64)
+        return ((np.outer(values, self.a) + self.b) % PRIME).min(axis=0)
+
+    def reserve(self, size):
+        """Увеличивает массивы вдвое, когда в них не хватает места."""
+        capacity = len(self.recipe_ids)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2, 1024)
+        grow = capacity - len(self.recipe_ids)
+        self.recipe_ids = np.concatenate(
+            [self.recipe_ids, np.zeros(grow, dtype=np.int64)])
+        self.lengths = np.concatenate(
+            [self.lengths, np.zeros(grow, dtype=np.int32)])
+        self.signatures = np.concatenate([
+            self.signatures,
+            np.full((grow, self.num_perm), EMPTY, dtype=np.int64)
+        ])
+
+    def update(self, recipe_id, ingredient_ids):
+        """Добавляет, заменяет или (при пустом наборе) очищает рецепт."""
+        ingredient_ids = frozenset(ingredient_ids)
+        row = self.rows.get(recipe_id)
+        if row is None:
+            if not ingredient_ids:
+                return
+            row = self.rows[recipe_id] = self.size
+            self.reserve(row + 1)
+            self.sets.append(frozenset())
+            self.recipe_ids[row] = recipe_id
+        old = self.sets[row]
+        for ingredient_id in old - ingredient_ids:
+            self.postings[ingredient_id].discard(row)
+            self.posting_arrays.pop(ingredient_id, None)
+        for ingredient_id in ingredient_ids - old:
+            self.postings[ingredient_id].add(row)
+            self.posting_arrays.pop(ingredient_id, None)
+        self.sets[row] = ingredient_ids
+        self.lengths[row] = len(ingredient_ids)
+        self.signatures[row] = self.signature(ingredient_ids)
+
+    def extend(self, sets):
+        """Массовое добавление новых рецептов: сигнатуры считаются
+        векторно пачками примерно по CHUNK_SIZE значений хэшей."""
+        items = [
+            (recipe_id, frozenset(ingredient_ids))
+            for recipe_id, ingredient_ids in sets.items()
+            if ingredient_ids and recipe_id not in self.rows
+        ]
+        start = self.size
+        self.reserve(start + len(items))
+        for offset, (recipe_id, ingredient_ids) in enumerate(items):
+            row = start + offset
+            self.rows[recipe_id] = row
+            self.recipe_ids[row] = recipe_id
+            self.lengths[row] = len(ingredient_ids)
+            self.sets.append(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                self.postings[ingredient_id].add(row)
+        self.posting_arrays.clear()
+        chunk = max(1, CHUNK_SIZE // self.num_perm)
+        for offset in range(0, len(items), chunk):
+            batch = items[offset:offset + chunk]
+            values = np.fromiter(
+                (pk for _, ingredient_ids in batch for pk in ingredient_ids),
+                dtype=np.int64
+            )
+            starts = np.cumsum(
+                [0] + [len(ingredient_ids) for _, ingredient_ids in batch]
+            )[:-1]
+            hashes = (np.outer(values, self.a) + self.b) % PRIME
+            self.signatures[start + offset:start + offset + len(batch)] = (
+                np.minimum.reduceat(hashes, starts, axis=0)
+            )
+
+    def posting_array(self, ingredient_id):
+        array = self.posting_arrays.get(ingredient_id)
+        if array is None:
+            array = np.fromiter(
+                self.postings.get(ingredient_id, ()), dtype=np.int64
+            )
+            self.posting_arrays[ingredient_id] = array
+        return array
+
+    def similar(self, recipe_id, limit):
+        """Рецепты с наибольшим коэффициентом Жаккара по ингредиентам.
+        Кандидаты отбираются по оценке MinHash, затем сортируются
+        по точному значению."""
+        row = self.rows.get(recipe_id)
+        if row is None or not self.lengths[row]:
+            return []
+        size = self.size
+        matches = (self.signatures[:size] == self.signatures[row]).sum(axis=1)
+        matches[row] = 0
+        count = min(size, limit * settings.SIMILARITY_CANDIDATES_FACTOR)
+        candidates = np.argpartition(-matches, count - 1)[:count]
+        candidates = candidates[matches[candidates] > 0]
+        own = self.sets[row]
+        ranked = sorted(
+            (
+                -len(own & self.sets[other]) / len(own | self.sets[other]),
+                -int(self.recipe_ids[other]),
+            )
+            for other in candidates.tolist()
+        )
+        return [-recipe_id for _, recipe_id in ranked[:limit]]
+
+    def cook_with(self, ingredient_ids, limit, missing=0):
+        """Рецепты, для которых из ingredient_ids не хватает не больше
+        missing ингредиентов: сначала с меньшим числом недостающих,
+        затем с большим числом совпадающих, затем новые."""
+        arrays = [
+            self.posting_array(ingredient_id)
+            for ingredient_id in set(ingredient_ids)
+            if self.postings.get(ingredient_id)
+        ]
+        if not arrays:
+            return []
+        size = self.size
+        counts = np.bincount(np.concatenate(arrays), minlength=size)
+        lacking = self.lengths[:size] - counts
+        candidates = np.flatnonzero((counts > 0) & (lacking <= missing))
+        order = np.lexsort((
+            -self.recipe_ids[candidates],
+            -counts[candidates],
+            lacking[candidates],
+        ))
+        return self.recipe_ids[candidates[order[:limit]]].tolist()
+
+    def save(self, path):
+        """Сохраняет наборы ингредиентов, сигнатуры и отпечаток БД
+        в файл .npz. Файл пишется во временный и подменяется целиком,
+        чтобы процессы не прочитали его недописанным."""
+        size = self.size
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(self.lengths[:size])
+        indices = np.fromiter(
+            (pk for ingredient_ids in self.sets for pk in ingredient_ids),
+            dtype=np.int64, count=int(indptr[-1])
+        )
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(temp_path, 'wb') as file:
+                np.savez(
+                    file,
+                    recipe_ids=self.recipe_ids[:size],
+                    signatures=self.signatures[:size],
+                    indptr=indptr,
+                    indices=indices,
+                    num_perm=np.array([self.num_perm], dtype=np.int64),
+                    fingerprint=np.array(
+                        self.fingerprint or (), dtype=np.int64
+                    ),
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Загружает индекс из файла .npz или возвращает None,
+        если файл записан без отпечатка БД."""
+        with np.load(path) as data:
+            if 'fingerprint' not in data.files:
+                return None
+            index = cls(int(data['num_perm'][0]))
+            index.fingerprint = tuple(data['fingerprint'].tolist())
+            recipe_ids = data['recipe_ids']
+            indptr = data['indptr']
+            indices = data['indices']
+            size = len(recipe_ids)
+            index.reserve(size)
+            index.recipe_ids[:size] = recipe_ids
+            index.signatures[:size] = data['signatures']
+        index.lengths[:size] = np.diff(indptr)
+        for row, recipe_id in enumerate(recipe_ids.tolist()):
+            ingredient_ids = frozenset(
+                indices[indptr[row]:indptr[row + 1]].tolist()
+            )
+            index.rows[recipe_id] = row
+            index.sets.append(ingredient_ids)
+            for ingredient_id in ingredient_ids:
+                index.postings[ingredient_id].add(row)
+        return index
+
+    def apply_log(self, position):
+        """Применяет изменения из журнала до позиции position.
+        Возвращает False, если часть журнала уже вытеснена из кэша
+        или изменений больше MAX_REPLAY и дешевле построить заново."""
+        if position - self.position > MAX_REPLAY:
+            return False
+        keys = [
+            CHANGE_KEY.format(position=number)
+            for number in range(self.position + 1, position + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        recipe_ids = set(changes.values())
+        sets = load_sets(recipe_ids)
+        for recipe_id in recipe_ids:
+            self.update(recipe_id, sets.get(recipe_id, ()))
+        self.position = position
+        return True
+
+
+def build(generation=None):
+    """Строит индекс по всем рецептам из БД. Позиция журнала
+    и отпечаток БД запоминаются до чтения данных, поэтому изменения,
+    сделанные во время построения, будут применены повторно,
+    а сохраненный файл будет считаться устаревшим."""
+    index = SimilarityIndex()
+    index.position = cache.get(LOG_KEY) or 0
+    index.generation = generation
+    index.fingerprint = fingerprint()
+    index.extend(load_sets())
+    return index
+
+
+class SharedSimilarityIndex:
+    """Индекс процесса, синхронизируемый с журналом изменений.
+
+    При смене поколения в кэше индекс загружается из файла
+    SIMILARITY_INDEX_PATH, если отпечаток БД в файле совпадает
+    с текущим, иначе строится из БД. Файл пишет другой процесс,
+    поэтому поколение и позиция журнала в кэше с ним не сравниваются.
+
+    Поколение и журнал доходят до других процессов только через общий
+    кэш. Поэтому раз в SIMILARITY_INDEX_MAX_AGE секунд отпечаток БД
+    сравнивается с отпечатком индекса, и при расхождении индекс
+    загружается заново: с локальным кэшем по умолчанию изменения
+    из других процессов, в том числе reset() из generate_data
+    и load_data, видны не позже чем через SIMILARITY_INDEX_MAX_AGE."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+
+    def invalidate(self):
+        self._index = None
+
+    def is_expired(self, index):
+        return (time.monotonic() - index.checked_at
+                > settings.SIMILARITY_INDEX_MAX_AGE)
+
+    def _load(self, generation, position, current=None):
+        """Позиция журнала прочитана до отпечатка: изменения после
+        нее либо уже видны в отпечатке, либо будут применены из
+        журнала."""
+        path = settings.SIMILARITY_INDEX_PATH
+        if os.path.exists(path):
+            index = SimilarityIndex.load(path)
+            if (index is not None
+                    and index.num_perm == settings.SIMILARITY_NUM_PERM
+                    and index.fingerprint == (current or fingerprint())):
+                index.generation = generation
+                index.position = position
+                return index
+        return build(generation)
+
+    def get(self):
+        generation = get_version(GENERATION_KEY)
+        position = cache.get(LOG_KEY) or 0
+        with self._lock:
+            index = self._index
+            if index is None or index.generation != generation:
+                index = self._load(generation, position)
+            elif self.is_expired(index):
+                current = fingerprint()
+                if current == index.fingerprint:
+                    index.checked_at = time.monotonic()
+                else:
+                    index = self._load(generation, position, current)
+            if position < index.position or (
+                    position > index.position
+                    and not index.apply_log(position)):
+                index = build(generation)
+            self._index = index
+        return index
+
+    def similar(self, recipe_id, limit):
+        return self.get().similar(recipe_id, limit)
+
+    def cook_with(self, ingredient_ids, limit, missing=0):
+        return self.get().cook_with(ingredient_ids, limit, missing)
+
+
+similarity_index = SharedSimilarityIndex()
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+
+from .cache import TAGS_VERSION_KEY, get_version
+from .models import Tag
+
+
+class TagRegistryData:
+    def __init__(self, version, tags):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.tags = tags
+        self.digest = hashlib.md5(repr([
+            (tag.id, tag.name, tag.color, tag.slug) for tag in tags
+        ]).encode()).hexdigest()
+        self.by_id = {tag.id: tag for tag in tags}
+        self.by_slug = {tag.slug: tag for tag in tags}
+        self.representations = {}
+
+
+class TagRegistry:
+    """Справочник тэгов в памяти процесса.
+
+    Тэги загружаются одним запросом при первом обращении и
+    перезагружаются, когда меняется версия справочника в кэше или
+    справочник старше TAG_REGISTRY_MAX_AGE секунд. Версию сбрасывают
+    сигналы Tag; сразу ее видят только процессы с общим кэшем. При
+    локальном кэше по умолчанию изменения из других процессов видны
+    после перезагрузки по возрасту.
+
+    digest - хэш содержимого справочника: одинаков во всех процессах
+    с одинаковыми тэгами, поэтому подходит для ETag."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = None
+
+    def invalidate(self):
+        self._data = None
+
+    def is_stale(self, data, version):
+        return data is None or data.version != version or (
+            time.monotonic() - data.loaded_at
+            > settings.TAG_REGISTRY_MAX_AGE
+        )
+
+    def _load(self):
+        version = get_version(TAGS_VERSION_KEY)
+        data = self._data
+        if self.is_stale(data, version):
+            with self._lock:
+                data = self._data
+                if self.is_stale(data, version):
+                    data = TagRegistryData(
+                        version, list(Tag.objects.order_by('id'))
+                    )
+                    self._data = data
+        return data
+
+    @property
+    def digest(self):
+        return self._load().digest
+
+    def all(self):
+        return self._load().tags
+
+    def get(self, pk):
+        return self._load().by_id.get(pk)
+
+    def get_by_slug(self, slug):
+        return self._load().by_slug.get(slug)
+
+    def representations(self, serializer_class):
+        """Словарь pk -> представление тэга, построенное сериализатором
+        serializer_class один раз для текущей версии справочника."""
+        data = self._load()
+        if serializer_class not in data.representations:
+            data.representations[serializer_class] = {
+                tag.id: serializer_class(tag).data for tag in data.tags
+            }
+        return data.representations[serializer_class]
+
+
+tag_registry = TagRegistry()
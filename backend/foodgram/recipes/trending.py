@@ -0,0 +1,145 @@
+import heapq
+import math
+from datetime import timedelta
+from functools import partial
+from itertools import takewhile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Favourite, Recipe, ShoppingCart, TrendingWatermark
+
+SOURCES = {
+    'favourite': Favourite,
+    'shopping_cart': ShoppingCart,
+}
+TOP_KEY = 'trending:top'
+
+
+def logaddexp(first, second):
+    """log(exp(first) + exp(second)) без переполнения.
+    None означает отсутствие событий."""
+    if first is None:
+        return second
+    if second is None:
+        return first
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def event_score(weight, timestamp):
+    """Логарифм веса события, приведенного к фиксированной эпохе:
+    log(weight * 2 ** ((timestamp - epoch) / half_life)).
+
+    Затухание всех рецептов к текущему моменту одинаково, поэтому
+    сравнивать можно сами суммы без пересчета при каждом чтении."""
+    return math.log(weight) + (
+        (timestamp - settings.TRENDING_EPOCH)
+        * math.log(2) / settings.TRENDING_HALF_LIFE
+    )
+
+
+def accumulate(scores, events):
+    """Добавляет события (recipe_id, timestamp, weight) в словарь
+    recipe_id -> score."""
+    for recipe_id, timestamp, weight in events:
+        scores[recipe_id] = logaddexp(
+            scores.get(recipe_id), event_score(weight, timestamp)
+        )
+    return scores
+
+
+def merge_top(top, updates, size):
+    """Объединяет top-K [(score, recipe_id), ...] с новыми оценками.
+    Оценки только растут, поэтому рецепт вне top-K может попасть
+    в него лишь если он есть в updates."""
+    merged = {recipe_id: score for score, recipe_id in top}
+    merged.update(updates)
+    return heapq.nlargest(
+        size, ((score, recipe_id) for recipe_id, score in merged.items())
+    )
+
+
+def get_top():
+    """Top-K [(score, recipe_id), ...]. update_trending обычно
+    работает в отдельном процессе, а кэш по умолчанию локален
+    для процесса, поэтому top-K хранится не дольше
+    TRENDING_TOP_CACHE_TIMEOUT и затем заново читается из
+    trending_score."""
+    top = cache.get(TOP_KEY)
+    if top is None:
+        top = list(Recipe.objects.filter(
+            trending_score__isnull=False
+        ).order_by('-trending_score').values_list(
+            'trending_score', 'id'
+        )[:settings.TRENDING_TOP_K])
+        cache.set(TOP_KEY, top, settings.TRENDING_TOP_CACHE_TIMEOUT)
+    return top
+
+
+def update_top(updates):
+    cache.set(
+        TOP_KEY, merge_top(get_top(), updates, settings.TRENDING_TOP_K),
+        settings.TRENDING_TOP_CACHE_TIMEOUT
+    )
+
+
+def read_events(batch_size, horizon, watermarks):
+    """Читает события после отметок по порядку id. Чтение источника
+    останавливается на первом событии не старше horizon, и отметка
+    не переходит через него: иначе событие с меньшим id, но более
+    поздним created, было бы пропущено навсегда."""
+    events = []
+    for source, model in SOURCES.items():
+        watermark = watermarks[source]
+        rows = list(takewhile(
+            lambda row: row[2] < horizon,
+            model.objects.filter(
+                id__gt=watermark.last_id
+            ).order_by('id').values_list('id', 'recipe_id', 'created')[
+                :batch_size
+            ]
+        ))
+        if rows:
+            watermark.last_id = rows[-1][0]
+            watermark.save(update_fields=['last_id'])
+        weight = settings.TRENDING_WEIGHTS[source]
+        events.extend(
+            (recipe_id, created.timestamp(), weight)
+            for _, recipe_id, created in rows
+        )
+    return events
+
+
+def process_events(batch_size):
+    """Учитывает в популярности рецептов до batch_size новых событий
+    каждого источника и возвращает их число.
+
+    Очередь событий - строки избранного и корзин с id больше
+    отметки TrendingWatermark. Событие моложе TRENDING_LAG секунд
+    и все следующие за ним откладываются до следующего запуска, чтобы
+    не пропустить строки транзакций, которые еще не зафиксированы."""
+    for source in SOURCES:
+        TrendingWatermark.objects.get_or_create(source=source)
+    horizon = timezone.now() - timedelta(seconds=settings.TRENDING_LAG)
+    with transaction.atomic():
+        watermarks = TrendingWatermark.objects.select_for_update().in_bulk(
+            SOURCES, field_name='source'
+        )
+        events = read_events(batch_size, horizon, watermarks)
+        updates = accumulate({}, events)
+        current = Recipe.objects.filter(
+            pk__in=updates, trending_score__isnull=False
+        ).values_list('id', 'trending_score')
+        for recipe_id, score in current:
+            updates[recipe_id] = logaddexp(score, updates[recipe_id])
+        Recipe.objects.bulk_update(
+            [Recipe(id=recipe_id, trending_score=score)
+             for recipe_id, score in updates.items()],
+            ['trending_score'],
+            batch_size=1000,
+        )
+        transaction.on_commit(partial(update_top, updates))
+    return len(events)
@@ -0,0 +1,95 @@
+import re
+
+# Единица измерения -> (величина, множитель к базовой единице величины).
+UNITS = {
+    'мг': ('mass', 0.001),
+    'г': ('mass', 1),
+    'кг': ('mass', 1000),
+    'мл': ('volume', 1),
+    'л': ('volume', 1000),
+    'ч. л.': ('volume', 5),
+    'ст. л.': ('volume', 15),
+    'стакан': ('volume', 200),
+    'шт.': ('pieces', 1),
+}
+ALIASES = {
+    'гр': 'г', 'грамм': 'г', 'килограмм': 'кг', 'литр': 'л',
+    'ч.л.': 'ч. л.', 'ст.л.': 'ст. л.', 'шт': 'шт.', 'штука': 'шт.',
+}
+# Единицы для вывода суммы: от большей к меньшей, с порогом перехода.
+DISPLAY_UNITS = {
+    'mass': (('кг', 1000), ('г', 1), ('мг', 0.001)),
+    'volume': (('л', 1000), ('мл', 1)),
+    'pieces': (('шт.', 1),),
+}
+DISPLAY_UNIT_NAMES = {
+    unit for units in DISPLAY_UNITS.values() for unit, _ in units
+}
+SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_name(name):
+    """Ключ для объединения почти одинаковых названий:
+    без учета регистра, ё/е и лишних пробелов."""
+    return SPACES_RE.sub(' ', name).strip().lower().replace('ё', 'е')
+
+
+def normalize_unit(unit):
+    unit = SPACES_RE.sub(' ', unit).strip().lower()
+    return ALIASES.get(unit, unit)
+
+
+def humanize(amount, dimension):
+    """Переводит количество в базовых единицах в самую крупную
+    единицу, в которой оно не меньше 1."""
+    for unit, factor in DISPLAY_UNITS[dimension]:
+        if amount >= factor:
+            break
+    return round_amount(amount / factor), unit
+
+
+def round_amount(amount):
+    amount = round(amount, 2)
+    return int(amount) if amount == int(amount) else amount
+
+
+def merge_amounts(rows):
+    """Объединяет строки списка покупок.
+
+    Строки - словари с ключами ingredient__name,
+    ingredient__measurement_unit и final_amount. Количества в известных
+    единицах одной величины переводятся в базовую единицу и
+    складываются; строки в неизвестных единицах складываются только
+    с такими же. Сумма выводится в удобной единице (кг, г, л, мл),
+    но ложки и стаканы без примеси других единиц остаются как есть.
+
+    Генератор не потоковый: почти одинаковые названия не обязательно
+    соседние в порядке БД, поэтому сначала читаются все строки
+    и в памяти держится по группе на продукт, а результат выдается
+    отсортированным после чтения."""
+    groups = {}
+    for row in rows:
+        unit = normalize_unit(row['ingredient__measurement_unit'])
+        dimension, factor = UNITS.get(unit, (unit, None))
+        key = (normalize_name(row['ingredient__name']), dimension)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'name': row['ingredient__name'], 'units': set(), 'amount': 0,
+            }
+        group['units'].add(unit)
+        group['amount'] += row['final_amount'] * (factor or 1)
+    for (_, dimension), group in sorted(groups.items()):
+        if dimension not in DISPLAY_UNITS:
+            amount, unit = group['amount'], dimension
+        elif not group['units'] & DISPLAY_UNIT_NAMES and len(
+                group['units']) == 1:
+            unit = group['units'].pop()
+            amount = round_amount(group['amount'] / UNITS[unit][1])
+        else:
+            amount, unit = humanize(group['amount'], dimension)
+        yield {
+            'ingredient__name': group['name'],
+            'ingredient__measurement_unit': unit,
+            'final_amount': amount,
+        }